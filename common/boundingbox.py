@@ -47,6 +47,9 @@ class BoundingBox(object):
         self.ymin = self.checkMin(self.ymin, y - radius if y else y)
         self.ymax = self.checkMax(self.ymax, y + radius if y else y)
         
+    def copy(self):
+        return BoundingBox(self.xmin, self.ymin, self.xmax, self.ymax)
+        
     def addBoundingBox(self, other):
         self.addPoint(other.xmin, other.ymin)
         self.addPoint(other.xmax, other.ymax)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import hashlib
+import json
+import sqlite3
+
+from rulebase import KLCRuleBase
+
+# Hash a string (or a list of strings) into an hex digest
+def contentHash(data):
+    md5 = hashlib.md5()
+    if not isinstance(data, (list, tuple)):
+        data = [data]
+    for d in data:
+        if not isinstance(d, bytes):
+            d = d.encode('utf-8')
+        md5.update(d)
+        # separator, so ['ab', 'c'] and ['a', 'bc'] differ
+        md5.update(b'\0')
+    return md5.hexdigest()
+
+# Hash the content of a list of source files
+def sourceHash(filenames):
+    data = []
+    for filename in filenames:
+        # python 2 reports the compiled file
+        if filename.endswith('.pyc'):
+            filename = filename[:-1]
+        with open(filename, 'rb') as f:
+            data.append(f.read())
+    return contentHash(data)
+
+# Source file of the module defining the given class
+def _classSource(cls):
+    return sys.modules[cls.__module__].__file__
+
+# The root of the repository (common/ is in it)
+_REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Source files of all the loaded modules of the repository: the checker, the
+# parsers, the rules and all the modules they import (constants, geometry...)
+def loadedSources():
+    sources = set()
+    for module in list(sys.modules.values()):
+        filename = getattr(module, '__file__', None)
+        if not filename:
+            continue
+        filename = os.path.abspath(filename)
+        if filename.startswith(_REPOSITORY + os.sep):
+            sources.add(filename)
+    return sorted(sources)
+
+class CachedRule(KLCRuleBase):
+    """
+    A rule replaying the result of a previous check, stored in a CheckCache
+    """
+    def __init__(self, record):
+        name, description, error, messages = record
+        KLCRuleBase.__init__(self, name, description)
+        self.error_found = error
+        self.messageBuffer = [list(m) for m in messages]
+
+    def check(self):
+        return self.error_found
+
+    def fix(self):
+        raise NotImplementedError('A cached result can not be fixed')
+
+class CheckCache(object):
+    """
+    A persistent (SQLite) cache of KLC check results
+
+    Results are stored per item (symbol or footprint), keyed by:
+      - the hash of the content of the item
+      - the version of the rule set (hash of the rule sources)
+      - the selection of rules
+      - the version of the tool (hash of the sources of all the loaded
+        modules of the repository, so it must be created after the rules
+        are imported)
+
+    A result is a dictionary with the 'name' of the item and the 'rules'
+    that produced output or errors, as [name, description, error, messages].
+    Messages are stored unfiltered (all verbosity levels).
+    """
+
+    def __init__(self, filename, rules):
+        self.filename = filename
+
+        rule_sources = [_classSource(rule) for rule in rules]
+        # the rule base classes
+        for rule in rules:
+            for base in rule.__mro__[1:]:
+                if base is not object and _classSource(base) not in rule_sources:
+                    rule_sources.append(_classSource(base))
+
+        self.ruleset = sourceHash(sorted(set(rule_sources)))
+        self.selection = ','.join(rule.__module__ for rule in rules)
+        self.tool = contentHash([sourceHash(loadedSources()), sys.version.split()[0]])
+
+        self.db = sqlite3.connect(filename, timeout=60)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS results (
+            item TEXT, ruleset TEXT, selection TEXT, tool TEXT, result TEXT,
+            PRIMARY KEY (item, ruleset, selection, tool))""")
+        self.db.commit()
+
+    def get(self, item):
+        row = self.db.execute("SELECT result FROM results WHERE item=? AND ruleset=? AND selection=? AND tool=?",
+            (item, self.ruleset, self.selection, self.tool)).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+    def put(self, item, result):
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+            (item, self.ruleset, self.selection, self.tool, json.dumps(result)))
+
+    def commit(self):
+        self.db.commit()
+
+    # the record of a rule that was just checked
+    # (must be called before processOutput, which clears the messages)
+    @staticmethod
+    def record(rule, error):
+        return [rule.name, rule.description, bool(error), [list(m) for m in rule.messageBuffer]]
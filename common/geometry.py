@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Geometry shared by the footprint class (KicadMod) and the footprint rules.
+
+Points are (x, y) tuples and boxes are (x1, y1, x2, y2) tuples with x1 <= x2
+and y1 <= y2. Angles are in degrees, a positive rotation maps the x axis to the
+y axis. Pads are the dictionaries of KicadMod.pads.
+
+"""
+
+from __future__ import division
+
+import cmath
+import math
+
+# (cos, sin) of the rotation angles, footprints only use a few of them
+_rotations = {}
+
+def rotation(degrees):
+    try:
+        return _rotations[degrees]
+    except KeyError:
+        radians = degrees * math.pi / 180
+        r = (math.cos(radians), math.sin(radians))
+        if len(_rotations) < 4096:
+            _rotations[degrees] = r
+        return r
+
+# Rotate a point around the origin
+def rotatePoint(x, y, degrees):
+    cos, sin = rotation(degrees)
+    return (x * cos - y * sin, y * cos + x * sin)
+
+# Do the two boxes overlap (touching boxes overlap)
+def boxesOverlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+# The bounding box of a list of points
+def pointsBox(points):
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+# A box grown by margin on every side
+def growBox(box, margin):
+    return (box[0] - margin, box[1] - margin, box[2] + margin, box[3] + margin)
+
+# The bounding box of a circle
+def circleBounds(cx, cy, radius):
+    return (cx - radius, cy - radius, cx + radius, cy + radius)
+
+# The exact bounding box of an arc of center (cx, cy), starting at (sx, sy) and
+# sweeping angle degrees: the end points and the extreme points of the circle
+# (at 0, 90, 180 and 270 degrees) crossed by the arc
+def arcBounds(cx, cy, sx, sy, angle):
+    dx = sx - cx
+    dy = sy - cy
+    radius = math.hypot(dx, dy)
+
+    if abs(angle) >= 360:
+        return circleBounds(cx, cy, radius)
+
+    ex, ey = rotatePoint(dx, dy, angle)
+    points = [(sx, sy), (cx + ex, cy + ey)]
+
+    start = math.degrees(math.atan2(dy, dx))
+    lo = min(start, start + angle)
+    hi = max(start, start + angle)
+
+    extremes = [(radius, 0), (0, radius), (-radius, 0), (0, -radius)]
+    for k in range(int(math.ceil(lo / 90)), int(math.floor(hi / 90)) + 1):
+        x, y = extremes[k % 4]
+        points.append((cx + x, cy + y))
+
+    return pointsBox(points)
+
+# The four corners of a pad (or of its bounding rectangle for round shapes)
+# as complex numbers, rotated with the pad, optionally moved by the drill offset
+# (corners 0 and 1, 2 and 3 are opposite)
+def padCorners(pad, offset=True):
+    padComplex = complex(pad['pos']['x'], pad['pos']['y'])
+    padOffset = 0 + 0j
+    if offset and 'offset' in pad['drill']:
+        if 'x' in pad['drill']['offset']:
+            padOffset = complex(pad['drill']['offset']['x'], pad['drill']['offset']['y'])
+
+    hx = pad['size']['x'] / 2.0
+    hy = pad['size']['y'] / 2.0
+
+    vectorR = cmath.rect(1, cmath.pi / 180 * pad['pos']['orientation'])
+
+    corners = [complex(hx, hy), complex(-hx, -hy), complex(hx, -hy), complex(-hx, hy)]
+    return [((c + padComplex + padOffset) - padComplex) * vectorR + padComplex for c in corners]
+
+# The outline of a pad (or of its bounding rectangle for round shapes), rotated
+# with the pad, as a list of points
+def padPolygon(pad):
+    px = pad['pos']['x']
+    py = pad['pos']['y']
+
+    hx = pad['size']['x'] / 2
+    hy = pad['size']['y'] / 2
+
+    cos, sin = rotation(pad['pos']['orientation'])
+
+    return [(px + (x * cos - y * sin), py + (y * cos + x * sin)) for x, y in [(-hx, -hy), (-hx, hy), (hx, hy), (hx, -hy)]]
+
+# Does a circle (center and a point of the circle) cross a pad, or come closer
+# than clearance to a round pad
+def circleIntersectsPad(center, end, pad, clearance=0.075):
+    padComplex = complex(pad['pos']['x'], pad['pos']['y'])
+    centerComplex = complex(center[0], center[1])
+    radius = abs(complex(end[0], end[1]) - centerComplex)
+
+    if 'circle' in pad['shape']:
+        distance = radius + pad['size']['x'] / 2.0 + clearance
+        return (abs(centerComplex - padComplex) < distance and
+                abs(centerComplex - padComplex) > abs(-radius + pad['size']['x'] / 2.0 + clearance))
+
+    # if there are corners inside and outside the circle, we have an intersection
+    inside = [abs(centerComplex - corner) < radius for corner in padCorners(pad)]
+    return any(inside) and not all(inside)
+
+# Does a segment cross a pad, or come closer than clearance to it
+def segmentIntersectsPad(start, end, pad, clearance=0.075):
+    padComplex = complex(pad['pos']['x'], pad['pos']['y'])
+    edgesPad = padCorners(pad)
+
+    # translate the segment and the pad to (0, 0), with the segment going up
+    startComplex = complex(start[0], start[1])
+    endComplex = complex(end[0], end[1])
+    if endComplex.imag > startComplex.imag:
+        vector = endComplex - startComplex
+        padComplex = padComplex - startComplex
+        for i in range(4):
+            edgesPad[i] = edgesPad[i] - startComplex
+    else:
+        vector = startComplex - endComplex
+        padComplex = padComplex - endComplex
+        for i in range(4):
+            edgesPad[i] = edgesPad[i] - endComplex
+    length = abs(vector)
+
+    # rotate them, so the segment is on the x axis
+    vectorR = cmath.rect(1, -cmath.phase(vector))
+    padComplex = padComplex * vectorR
+    for i in range(4):
+        edgesPad[i] = edgesPad[i] * vectorR
+
+    # the extent of the pad along the x axis
+    if 'circle' in pad['shape']:
+        distance = cmath.sqrt((pad['size']['x'] / 2.0) ** 2 - (padComplex.imag) ** 2).real
+        padMinX = padComplex.real - distance
+        padMaxX = padComplex.real + distance
+    else:
+        edges = [[0,3],[0,2],[2,1],[1,3]] #lines of the rectangle pads
+        x0 = [] #vector of value the x to y=0
+        for edge in edges:
+            x1 = edgesPad[edge[0]].real
+            x2 = edgesPad[edge[1]].real
+            y1 = edgesPad[edge[0]].imag
+            y2 = edgesPad[edge[1]].imag
+            if y1 != y2:
+                x = -y1 / (y2 - y1) * (x2 - x1) + x1
+                if x < max(x1, x2) and x > min(x1, x2):
+                    x0.append(x)
+        if x0:
+            padMinX = min(x0)
+            padMaxX = max(x0)
+        else:
+            return False
+
+    if ((padMinX < length and padMinX > 0) or
+        (padMaxX < length and padMaxX > 0) or
+        (padMaxX > length and padMinX < 0)) :
+        # the extent of the pad across the x axis
+        if 'circle' in pad['shape']:
+            distance = pad['size']['x'] / 2.0
+            padMin = padComplex.imag - distance
+            padMax = padComplex.imag + distance
+        else:
+            padMin = min(edgesPad[0].imag, edgesPad[1].imag, edgesPad[2].imag, edgesPad[3].imag)
+            padMax = max(edgesPad[0].imag, edgesPad[1].imag, edgesPad[2].imag, edgesPad[3].imag)
+        try:
+            differentSign = padMax / padMin
+        except:
+            differentSign = padMin / padMax
+        if (differentSign < 0) or (abs(padMax) < clearance) or (abs(padMin) < clearance):
+            return True
+
+    return False
+
+# The radius of the area around the position of a pad where segmentIntersectsPad
+# and circleIntersectsPad can find an intersection with the pad: the pad at any
+# orientation with its drill offset, and the clearance
+def padReach(pad, clearance=0.075):
+    reach = math.hypot(pad['size']['x'], pad['size']['y']) / 2.0
+
+    if 'offset' in pad['drill']:
+        if 'x' in pad['drill']['offset']:
+            reach += math.hypot(pad['drill']['offset']['x'], pad['drill']['offset']['y'])
+
+    # rounded up, for the rounding errors of the checks
+    return reach + clearance + 0.025
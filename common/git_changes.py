@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Helpers to find the files changed in a git repository since a given revision.
+
+The revision can be a single revision (compared with the working tree) or a
+range 'A..B' / 'A...B' (as in $TRAVIS_COMMIT_RANGE).
+
+"""
+
+import os
+import subprocess
+
+def _git(args, cwd=None):
+    pipe = subprocess.Popen(['git'] + args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = pipe.communicate()
+
+    if pipe.returncode != 0:
+        raise RuntimeError("git {cmd} failed: {err}".format(cmd=' '.join(args), err=err.decode('utf-8').strip()))
+
+    return out
+
+# The revision holding the 'old' version of the files
+def oldRevision(rev, cwd=None):
+    if '...' in rev:
+        a, b = rev.split('...')
+        return _git(['merge-base', a or 'HEAD', b or 'HEAD'], cwd).decode('utf-8').strip()
+    elif '..' in rev:
+        return rev.split('..')[0] or 'HEAD'
+
+    return rev
+
+# The directory used to run git commands on the given files
+def repositoryDir(files):
+    if files:
+        return os.path.dirname(os.path.abspath(files[0]))
+
+    return None
+
+# List the files added or modified since rev, with one of the given extensions
+# If files are given, only those are considered (in the given order and form),
+# otherwise the changed files of the repository are returned relative to the
+# current directory
+def changedFiles(rev, extensions, files=None):
+    top = _git(['rev-parse', '--show-toplevel'], repositoryDir(files)).decode('utf-8').strip()
+    out = _git(['diff', '--name-only', '--diff-filter=AM', rev], top).decode('utf-8')
+
+    changed = []
+    for name in out.splitlines():
+        if os.path.splitext(name)[1] in extensions:
+            changed.append(os.path.realpath(os.path.join(top, name)))
+
+    if files:
+        return [f for f in files if os.path.realpath(f) in changed]
+
+    return [os.path.relpath(f) for f in changed]
+
+# Write the content of filename at revision rev into dest
+# returns False if the file does not exist at rev
+def showFile(rev, filename, dest):
+    cwd = os.path.dirname(os.path.abspath(filename))
+
+    try:
+        data = _git(['show', '{rev}:./{name}'.format(rev=rev, name=os.path.basename(filename))], cwd)
+    except RuntimeError:
+        return False
+
+    with open(dest, 'wb') as f:
+        f.write(data)
+
+    return True
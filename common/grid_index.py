@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+A uniform grid spatial index of bounding boxes.
+
+The items are numbered in insertion order and query() returns the numbers of
+the items whose box overlaps a given box, sorted, so the items can be checked
+in their original order:
+
+    index = GridIndex(cell_size=1.0)
+    for pad in pads:
+        index.add(box_of(pad))
+    near = [pads[n] for n in index.query(box_of(line))]
+
+A box is a tuple (x1, y1, x2, y2) with x1 <= x2 and y1 <= y2, the helpers to
+build them are in geometry.py.
+
+"""
+
+import math
+
+from geometry import boxesOverlap
+
+class GridIndex(object):
+    """
+    Uniform grid of boxes, each box is stored in all the cells it overlaps
+    """
+    def __init__(self, cell_size):
+        if not cell_size > 0:
+            raise ValueError("Invalid cell size: {s}".format(s=cell_size))
+
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.boxes = []
+
+    # the range of cells covered by [lo, hi] along an axis
+    def _cells(self, lo, hi):
+        return range(int(math.floor(lo / self.cell_size)), int(math.floor(hi / self.cell_size)) + 1)
+
+    # add a box, returns the number of the item
+    def add(self, box):
+        n = len(self.boxes)
+        self.boxes.append(box)
+
+        for i in self._cells(box[0], box[2]):
+            for j in self._cells(box[1], box[3]):
+                self.cells.setdefault((i, j), []).append(n)
+
+        return n
+
+    # the numbers of the items overlapping box, sorted
+    def query(self, box):
+        xs = self._cells(box[0], box[2])
+        ys = self._cells(box[1], box[3])
+
+        found = set()
+
+        if len(xs) * len(ys) > len(self.cells):
+            # a large box (e.g. a long line across the footprint), it is
+            # faster to look at the cells which are not empty
+            for (i, j), items in self.cells.items():
+                if xs[0] <= i <= xs[-1] and ys[0] <= j <= ys[-1]:
+                    found.update(items)
+        else:
+            for i in xs:
+                for j in ys:
+                    items = self.cells.get((i, j))
+                    if items:
+                        found.update(items)
+
+        boxes = self.boxes
+        return sorted(n for n in found if boxesOverlap(boxes[n], box))
+
+    def __len__(self):
+        return len(self.boxes)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+Tokenizer for the lines of the legacy KiCad files (.lib, .sch).
+
+The fields are separated by whitespace, a field starting with a double quote
+extends up to the next double quote (quotes are kept). This gives the same
+tokens as the (much slower) shlex setup used before:
+
+    s = shlex.shlex(line)
+    s.whitespace_split = True
+    s.commenters = ''
+    s.quotes = '"'
+    tokens = list(s)
+
+"""
+
+import re
+
+# a quoted field, an unclosed quote or a plain field
+# (a quote inside a plain field is a regular character)
+_FIELD = re.compile(r'"[^"]*"|"|[^ \t\r\n"][^ \t\r\n]*')
+
+def splitLine(line):
+    tokens = _FIELD.findall(line)
+
+    if '"' in line and '"' in tokens:
+        raise ValueError("No closing quotation")
+
+    return tokens
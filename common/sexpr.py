@@ -3,6 +3,7 @@
 
 from __future__ import print_function
 import re
+import bisect
 
 dbg = False
 float_render = "%.2f"
@@ -16,7 +17,9 @@ term_regex = r'''(?mx)
         (?P<s>[^(^)\s]+)
        )'''
 
-def parse_sexp(sexp):
+# Original regex based parser, kept so results can be compared against the
+# scanner below (see parse_sexp engine selection)
+def parse_sexp_regex(sexp):
     stack = []
     out = []
     if dbg: print("%-6s %-14s %-44s %-s" % tuple("term value out stack".split()))
@@ -42,112 +45,411 @@ def parse_sexp(sexp):
             raise NotImplementedError("Error: %r" % (term, value))
     assert not stack, "Trouble with nesting of brackets"
     return out[0]
-    
-class SexprBuilder(object):
-    def __init__(self, key, *arg, **kwarg):
-        
-        self.key = key
-        self.indent = kwargs.get('indent', 0)
-    
-        self.indent = kwargs.get('indent', 0)
-        self.key = None
-        self.output = ''
-        self.items = []
-        
-    # Move to new line (optionally indent)
-    def newline(self, indent=False):
-        self.output += "\n"
-        if indent:
-            self.indent += 1
-        self.output += 2 * self.indent * ' '
-        
-    def begin(self, key=None):
-        self.key = key
-        self.items = []
-        
-        self.output += '('
-        if key:
-            self.output += str(key)
-        
-    def add(self, item):
-        self.items.append(item)
-        
-    def end(self, newline=False):
-        self.output.append()
-    
+
+# Characters which terminate a bare atom
+_WHITESPACE = frozenset(c for c in map(chr, range(0x3001)) if c.isspace())
+_DELIMITERS = _WHITESPACE | frozenset('()^')
+
+# Atoms are only converted to numbers if followed by one of these
+_NUMBER_END = frozenset(' )')
+
+# Finds atoms ending with a digit that are not followed by ' ' or ')'
+# (the only places where the fast path of parse_sexp_scan cannot decide
+# whether a token is a number)
+_ambiguous_number = re.compile(r'\d(?=[^\S ]|[(^]|\Z)')
+
+# Convert an atom to int / float if it has a number format
+def _atom(token):
+    body = token[1:] if token[0] in '+-' else token
+    head, dot, tail = body.partition('.')
+    if dot:
+        if not (head.isdecimal() and tail.isdecimal()):
+            return token
+    elif token[0] == '+' or not head.isdecimal():
+        return token
+    v = float(token)
+    if v.is_integer(): v = int(v)
+    return v
+
+# Character by character scanner, handles any input parse_sexp_regex does
+def _parse_sexp_chars(sexp):
+    stack = []
+    out = []
+    atoms = {}
+    i = 0
+    n = len(sexp)
+    while i < n:
+        c = sexp[i]
+        if c == '(':
+            stack.append(out)
+            out = []
+            i += 1
+        elif c == ')':
+            assert stack, "Trouble with nesting of brackets"
+            tmpout, out = out, stack.pop()
+            out.append(tmpout)
+            i += 1
+        elif c in _DELIMITERS:
+            i += 1
+        else:
+            # quoted string (an unmatched quote is read as a plain atom)
+            if c == '"':
+                j = sexp.find('"', i + 1)
+                if j >= 0:
+                    out.append(sexp[i + 1:j])
+                    i = j + 1
+                    continue
+            j = i + 1
+            while j < n and sexp[j] not in _DELIMITERS:
+                j += 1
+            token = sexp[i:j]
+            if j < n and sexp[j] in _NUMBER_END:
+                if token not in atoms:
+                    atoms[token] = _atom(token)
+                token = atoms[token]
+            out.append(token)
+            i = j
+    assert not stack, "Trouble with nesting of brackets"
+    return out[0]
+
+# Fast parser: splits the input at the quotes, then splits the unquoted
+# parts at whitespace and brackets with the str methods. Inputs the fast
+# path cannot handle exactly are passed to the character scanner.
+def parse_sexp_scan(sexp):
+    parts = sexp.split('"')
+
+    # odd number of quotes
+    if len(parts) % 2 == 0:
+        return _parse_sexp_chars(sexp)
+
+    for n in range(0, len(parts), 2):
+        part = parts[n]
+        # quote in the middle of an atom
+        if n + 1 < len(parts) and part and part[-1] not in _DELIMITERS:
+            return _parse_sexp_chars(sexp)
+        if _ambiguous_number.search(part):
+            return _parse_sexp_chars(sexp)
+
+    stack = []
+    out = []
+    atoms = {}
+    for n, part in enumerate(parts):
+        # quoted string
+        if n % 2:
+            out.append(part)
+            continue
+
+        part = part.replace('(', ' ( ').replace(')', ' ) ')
+        if '^' in part:
+            part = part.replace('^', ' ')
+
+        for token in part.split():
+            if token == '(':
+                stack.append(out)
+                out = []
+            elif token == ')':
+                assert stack, "Trouble with nesting of brackets"
+                tmpout, out = out, stack.pop()
+                out.append(tmpout)
+            else:
+                if token not in atoms:
+                    atoms[token] = _atom(token)
+                out.append(atoms[token])
+    assert not stack, "Trouble with nesting of brackets"
+    return out[0]
+
+# Parser engines, selectable per call or globally through parse_engine
+parse_engines = {
+    'regex': parse_sexp_regex,
+    'scan': parse_sexp_scan,
+}
+
+parse_engine = 'scan'
+
+def parse_sexp(sexp, engine=None):
+    return parse_engines[engine or parse_engine](sexp)
+
+# Event types yielded by iter_sexp
+ENTER_LIST = 'enter'
+ATOM = 'atom'
+EXIT_LIST = 'exit'
+
+_ENTER_EVENT = (ENTER_LIST, None)
+_EXIT_EVENT = (EXIT_LIST, None)
+
+# Split text into events, returns (events, number of characters consumed).
+# If final is False an atom or quoted string running up to the end of the
+# text is left unconsumed, as it may continue in the next chunk.
+def _scan_events(text, final):
+    events = []
+    parts = text.split('"')
+
+    # same fast path as parse_sexp_scan, only used if the text ends outside
+    # of any atom
+    fast = len(parts) % 2 == 1 and (final or text.endswith(')'))
+    if fast:
+        for n in range(0, len(parts), 2):
+            part = parts[n]
+            if n + 1 < len(parts) and part and part[-1] not in _DELIMITERS:
+                fast = False
+                break
+            if _ambiguous_number.search(part):
+                fast = False
+                break
+
+    if fast:
+        for n, part in enumerate(parts):
+            if n % 2:
+                events.append((ATOM, part))
+                continue
+
+            part = part.replace('(', ' ( ').replace(')', ' ) ')
+            if '^' in part:
+                part = part.replace('^', ' ')
+
+            for token in part.split():
+                if token == '(':
+                    events.append(_ENTER_EVENT)
+                elif token == ')':
+                    events.append(_EXIT_EVENT)
+                else:
+                    events.append((ATOM, _atom(token)))
+        return events, len(text)
+
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == '(':
+            events.append(_ENTER_EVENT)
+            i += 1
+        elif c == ')':
+            events.append(_EXIT_EVENT)
+            i += 1
+        elif c in _DELIMITERS:
+            i += 1
+        else:
+            if c == '"':
+                j = text.find('"', i + 1)
+                if j >= 0:
+                    events.append((ATOM, text[i + 1:j]))
+                    i = j + 1
+                    continue
+                if not final:
+                    break
+            j = i + 1
+            while j < n and text[j] not in _DELIMITERS:
+                j += 1
+            if j == n and not final:
+                break
+            token = text[i:j]
+            if j < n and text[j] in _NUMBER_END:
+                token = _atom(token)
+            events.append((ATOM, token))
+            i = j
+    return events, i
+
+# Read s-expression events from a file object, chunk_size characters at a
+# time. Yields (ENTER_LIST, None), (ATOM, value) and (EXIT_LIST, None)
+# tuples, atoms are converted in the same way as by parse_sexp.
+# The caller may stop iterating at any point, the rest of the file is not read.
+def iter_sexp(f, chunk_size=65536):
+    depth = 0
+    text = ''
+    while True:
+        chunk = f.read(chunk_size)
+        final = not chunk
+        text += chunk
+
+        # only pass on complete lists to the scanner
+        if final:
+            end = len(text)
+        else:
+            end = text.rfind(')') + 1
+            if end == 0:
+                continue
+
+        events, consumed = _scan_events(text[:end], final)
+        text = text[consumed:]
+
+        for event in events:
+            if event is _ENTER_EVENT:
+                depth += 1
+            elif event is _EXIT_EVENT:
+                assert depth, "Trouble with nesting of brackets"
+                depth -= 1
+            yield event
+
+        if final:
+            break
+    assert not depth, "Trouble with nesting of brackets"
+
+class SexprIndex(object):
+    """
+    An index of a parsed s-expression, built in a single pass over the tree.
+    Maps every (non numeric) atom to the lists containing it, in the order a
+    depth first search of the tree finds them, and keeps a parent link for
+    every list. Lists added to the tree after indexing are not found.
+    """
+    def __init__(self, data):
+        # atom -> ([stamp, ...], [list, ...])
+        self.atoms = {}
+        # id(list) -> [list, parent, first stamp, end stamp]
+        self.lists = {}
+        self._stamp = 0
+        self._add(data, None)
+
+    def _add(self, data, parent):
+        node = [data, parent, self._stamp, None]
+        self.lists[id(data)] = node
+        for i in data:
+            if type(i) == type([]):
+                self._add(i, data)
+            elif not type(i) in [int, float]:
+                if not i in self.atoms:
+                    self.atoms[i] = ([], [])
+                stamps, lists = self.atoms[i]
+                stamps.append(self._stamp)
+                lists.append(data)
+                self._stamp += 1
+        node[3] = self._stamp
+
+    def indexed(self, data):
+        return id(data) in self.lists
+
+    def parent(self, data):
+        return self.lists[id(data)][1]
+
+    # return the lists (inside of data, or data itself) which have value as
+    # an element, in the same order as a recursive search would
+    def find(self, value, data=None):
+        if not value in self.atoms:
+            return []
+        stamps, lists = self.atoms[value]
+        if data is None:
+            return list(lists)
+        node = self.lists[id(data)]
+        return lists[bisect.bisect_left(stamps, node[2]):bisect.bisect_left(stamps, node[3])]
+
+# Strings which must be quoted
+_needs_quotes = re.compile(r'[\s()\"]')
+
+# Formatted numbers (SexprItem), the same values are written over and over
+# (0.0 and -0.0 are equal but formatted differently, zero is not cached)
+_number_cache = {}
+_NUMBER_CACHE_SIZE = 65536
+
+def _formatFloat(val):
+    try:
+        return _number_cache[val]
+    except KeyError:
+        pass
+
+    text = str(round(val,10)).rstrip('0').rstrip('.')
+    if val and len(_number_cache) < _NUMBER_CACHE_SIZE:
+        _number_cache[val] = text
+    return text
+
+def _formatString(val):
+    if len(val) == 0:
+        return '""'
+    if _needs_quotes.search(val):
+        return '"%s"' % repr(val)[1:-1].replace('"', '\"')
+    return val
+
+def _formatList(val):
+    return ' '.join([SexprItem(v) for v in val])
+
+def _formatDict(val):
+    return ' '.join([SexprItem(val[key],key) for key in val.keys()])
+
+# The formatting of the values of SexprItem, by type
+_formatters = {
+    str: _formatString,
+    list: _formatList,
+    tuple: _formatList,
+    dict: _formatDict,
+    float: _formatFloat,
+    int: str,
+    }
+
 # Form a valid sexpr (single line)
 def SexprItem(val, key=None):
-    if key:
-        fmt = "(" + key + " {val})"
-    else:
-        fmt = "{val}"
-    
-    t = type(val)
-    
-    if val is None or t == str and len(val) == 0:
+    formatter = _formatters.get(type(val))
+
+    if formatter is not None:
+        val = formatter(val)
+    elif val is None:
         val = '""'
-    elif t in [list, tuple]:
-        val = ' '.join([SexprItem(v) for v in val])
-    elif t == dict:
-        values = []
-        for key in val.keys():
-            values.append(SexprItem(val[key],key))
-        val = ' '.join(values)
-    elif t == float:
-        val = str(round(val,10)).rstrip('0').rstrip('.')
-    elif t == int:
-        val = str(val)
-    #elif t == float:
-    #    val = float_render % val
-    elif t == str and re.search(r'[\s()\"]', val):
-        val = '"%s"' % repr(val)[1:-1].replace('"', '\"') 
-    
-    return fmt.format(val=val)
-    
+    else:
+        val = "{val}".format(val=val)
+
+    if key:
+        return "(" + key + " " + val + ")"
+
+    return val
+
+# Indentation (newline and spaces) of each indentation level
+_indentations = ['\n' + ' ' * 2 * n for n in range(32)]
+
+def _indentation(level):
+    if level < len(_indentations):
+        return _indentations[level]
+    return '\n' + ' ' * 2 * level
+
 class SexprBuilder(object):
-    def __init__(self, key):
+    """
+    Writer of an S-expression, item by item
+
+    The text is written to stream (any object with a write method, e.g. a file
+    or an io.StringIO) if given, otherwise it is kept in a list of chunks and
+    joined once in self.output
+    """
+    def __init__(self, key, stream=None):
         self.indent = 0
-        self.output = ''
         self.items = []
+        self._chunks = []
+        self._write = stream.write if stream is not None else self._chunks.append
         if key is not None:
             self.startGroup(key, newline=False)
-       
-    def _indent(self):
-        self.output += ' ' * 2 * self.indent
-   
-    def _newline(self):
-        self.output += '\n'
-        
+
+    # The text written so far (when not writing to a stream)
+    @property
+    def output(self):
+        if len(self._chunks) > 1:
+            self._chunks[:] = [''.join(self._chunks)]
+        return self._chunks[0] if self._chunks else ''
+
     def _addItems(self):
-        self.output += ' '.join(map(str,self.items))
-        self.items = []
-       
+        if self.items:
+            self._write(' '.join(map(str,self.items)))
+            self.items = []
+
     def startGroup(self, key=None, newline=True, indent=False):
         self._addItems()
         if newline and indent:
             self.indent += 1
         if newline:
-            self._newline()
-            self._indent()
-        self.output += '('
+            self._write(_indentation(self.indent))
         if key:
-            self.output += str(key) + ' '
-            
+            self._write('(' + str(key) + ' ')
+        else:
+            self._write('(')
+
     def endGroup(self, newline=True):
         self._addItems()
         if newline:
-            self._newline()
             if self.indent > 0:
                 self.indent -= 1
-            self._indent()
-        self.output += ')'
-        
+            self._write(_indentation(self.indent))
+        self._write(')')
+
     def addOptItem(self, key, item, newline=True, indent=False):
         if item in [None, 0, False]:
             return
-            
+
         self.addItems({key: item}, newline=newline, indent=indent)
-            
+
     def addItem(self, item, newline=True, indent=False):
         self._addItems()
         if newline and indent:
@@ -155,7 +457,7 @@ class SexprBuilder(object):
         if newline:
             self.newLine()
         self.items.append(SexprItem(item))
-            
+
     # Add a (preformatted) item
     def addItems(self, items, newline=True, indent=False):
         self._addItems()
@@ -168,18 +470,37 @@ class SexprBuilder(object):
                 self.items.append(SexprItem(item))
         else:
             self.items.append(SexprItem(items))
-            
+
     def newLine(self, indent=False):
         self._addItems()
-        self._newline()
         if indent:
             self.indent += 1
-        self._indent()
-        
+        self._write(_indentation(self.indent))
+
     def unIndent(self):
         if self.indent > 0:
             self.indent -= 1
-        
+
+# Numbers formatted with float_render (build_sexp), for the current float_render
+# (0.0 and -0.0 are equal but formatted differently, zero is not cached)
+_render_cache = {}
+_render_cache_format = [float_render]
+
+def _renderNumber(exp):
+    if _render_cache_format[0] != float_render:
+        _render_cache.clear()
+        _render_cache_format[0] = float_render
+
+    try:
+        return _render_cache[exp]
+    except KeyError:
+        text = float_render % exp
+        if exp and len(_render_cache) < _NUMBER_CACHE_SIZE:
+            _render_cache[exp] = text
+        return text
+
+_needs_build_quotes = re.compile(r'[\s()]')
+
 def build_sexp(exp, key=None):
     out = ''
     
@@ -187,10 +508,10 @@ def build_sexp(exp, key=None):
     if type(exp) == type([]):
         out += '('+ ' '.join(build_sexp(x) for x in exp) + ')'
         return out
-    elif type(exp) == type('') and re.search(r'[\s()]', exp):
+    elif type(exp) == type('') and _needs_build_quotes.search(exp):
         out += '"%s"' % repr(exp)[1:-1].replace('"', '\"')
     elif type(exp) in [int,float]:
-        out += float_render % exp
+        out += _renderNumber(exp)
     else:
         if exp == '':
             out += '""'
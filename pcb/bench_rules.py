@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+
+"""
+
+This file benchmarks the footprint rules on large footprints, a synthetic
+footprint (a grid of pads with random shapes, crossed by silkscreen lines and
+circles) and the given files.
+The new code paths are checked against the previous ones, which must produce
+identical results for every footprint.
+
+example of use: ./bench_rules.py --pads 2000 `find /usr/share/kicad/footprints -name *.kicad_mod`
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys, os
+import random
+import shutil
+import tempfile
+import timeit
+
+common = os.path.abspath(os.path.join(sys.path[0], '..','common'))
+
+if not common in sys.path:
+    sys.path.append(common)
+
+from kicad_mod import KicadMod
+from print_color import *
+import rules
+from rules import *
+from rules.context import FootprintContext
+
+# enable windows wildcards
+from glob import glob
+
+parser = argparse.ArgumentParser(description='Benchmark the footprint rules on large footprints (.kicad_mod)')
+parser.add_argument('kicad_mod_files', nargs='*')
+parser.add_argument('-n', '--repeat', help='number of timing runs per benchmark (best run is reported)', type=int, default=3)
+parser.add_argument('--pads', help='number of pads of the synthetic footprint', type=int, default=2000)
+parser.add_argument('--graphs', help='number of silkscreen lines and circles of the synthetic footprint', type=int, default=300)
+parser.add_argument('--seed', help='seed of the synthetic footprint', type=int, default=0)
+parser.add_argument('--nocolor', help='does not use colors to show the output', action='store_true')
+
+args = parser.parse_args()
+
+printer = PrintColor(use_color=not args.nocolor)
+
+files = []
+
+for f in args.kicad_mod_files:
+    files += glob(f)
+
+if args.kicad_mod_files and len(files) == 0:
+    printer.red("File argument invalid: {f}".format(f=args.kicad_mod_files))
+    sys.exit(1)
+
+mismatch = 0
+
+def best(stmt):
+    return min(timeit.repeat(stmt, number=1, repeat=args.repeat))
+
+def report(name, old, new):
+    printer.regular("{n:>10}: {o:.3f}s -> {t:.3f}s ({s:.2f}x)".format(n=name, o=old, t=new, s=old / new))
+
+# write a footprint with n_pads pads on a 1mm grid and n_graphs silkscreen
+# lines and circles across it
+def syntheticFootprint(filename, n_pads, n_graphs, seed):
+    rnd = random.Random(seed)
+
+    side = int(n_pads ** 0.5) + 1
+    half = side / 2.0
+
+    lines = ['(module SYNTHETIC (layer F.Cu) (tedit 58AA841A)']
+    lines.append('  (descr "Synthetic footprint, {n} pads")'.format(n=n_pads))
+    lines.append('  (tags "synthetic")')
+    lines.append('  (fp_text reference REF** (at 0 {y}) (layer F.SilkS)'.format(y=-half - 1))
+    lines.append('    (effects (font (size 1 1) (thickness 0.15)))')
+    lines.append('  )')
+    lines.append('  (fp_text value SYNTHETIC (at 0 {y}) (layer F.Fab)'.format(y=half + 1))
+    lines.append('    (effects (font (size 1 1) (thickness 0.15)))')
+    lines.append('  )')
+
+    def point():
+        return round(rnd.uniform(-half, half), 2), round(rnd.uniform(-half, half), 2)
+
+    for i in range(n_graphs):
+        layer = rnd.choice(['F.SilkS', 'B.SilkS'])
+        x1, y1 = point()
+        if i % 10 == 0:
+            lines.append('  (fp_circle (center {x} {y}) (end {e} {y}) (layer {l}) (width 0.12))'.format(x=x1, y=y1, e=x1 + round(rnd.uniform(0.2, 3), 2), l=layer))
+        else:
+            if i % 3 == 0:
+                # long line across the footprint
+                x2, y2 = point()
+            else:
+                x2, y2 = round(x1 + rnd.uniform(-2, 2), 2), round(y1 + rnd.uniform(-2, 2), 2)
+            lines.append('  (fp_line (start {x1} {y1}) (end {x2} {y2}) (layer {l}) (width 0.12))'.format(x1=x1, y1=y1, x2=x2, y2=y2, l=layer))
+
+    for i in range(n_pads):
+        x = i % side - half
+        y = i // side - half
+        shape = rnd.choice(['rect', 'circle', 'oval'])
+        size = round(rnd.uniform(0.3, 0.9), 2)
+        angle = rnd.choice(['', ' 45', ' 90'])
+        if i % 7 == 0:
+            drill = ' (drill 0.3 (offset {o} 0))'.format(o=round(rnd.uniform(-0.2, 0.2), 2))
+            kind = 'thru_hole'
+        else:
+            drill = ''
+            kind = 'smd'
+        lines.append('  (pad {n} {k} {s} (at {x} {y}{a}) (size {w} {h}){d} (layers F.Cu F.Paste F.Mask))'.format(
+            n=i + 1, k=kind, s=shape, x=x, y=y, a=angle, w=size, h=round(size * rnd.choice([1, 0.6]), 2), d=drill))
+
+    lines.append(')')
+
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+# rule 7.3 with the silkscreen checked against every pad (no spatial index)
+def rule7_3AllPads(module):
+    rule = rule7_3.Rule(module, None)
+    rule.padsNear = lambda graph: module.pads
+    return rule
+
+# the pad checks and queries which use the pad table (when NumPy is installed)
+def padChecks(module):
+    result = []
+    for rule in [rule8_3, rule9_4, rule9_6]:
+        rule = rule.Rule(module, None)
+        result.append((rule.check(), rule.messageBuffer))
+    for pad_type in ['smd', 'thru_hole']:
+        result.append([pad['number'] for pad in module.filterPads(pad_type)])
+    for bb in [module.padsBounds(), module.overpadsBounds()]:
+        result.append((bb.xmin, bb.ymin, bb.xmax, bb.ymax))
+    return result
+
+# the pad checks with the pad dictionaries
+def padChecksWithoutTable(module):
+    module.padsChanged()
+    module.__dict__['padTable'] = None
+    try:
+        return padChecks(module)
+    finally:
+        module.padsChanged()
+
+# the pad checks with a new pad table (its construction is timed too)
+def padChecksWithTable(module):
+    module.padsChanged()
+    return padChecks(module)
+
+# the layers queried by the rules
+LAYERS = ['F.SilkS', 'B.SilkS', 'F.Fab', 'B.Fab', 'F.CrtYd', 'B.CrtYd']
+
+# the layer queries of the rules, the graphics by layer are built again
+def layerQueries(module):
+    module.graphicsChanged()
+    return [(module.filterLines(layer), module.filterGraphs(layer)) for layer in LAYERS]
+
+# the layer queries, scanning all the graphics for each one
+def layerQueriesScan(module):
+    def scan(items, layer):
+        return [item for item in items if item['layer'] == layer]
+
+    return [(scan(module.lines, layer), scan(module.lines, layer) + scan(module.circles, layer) + scan(module.arcs, layer)) for layer in LAYERS]
+
+# the checks of all the rules, sharing the context of the footprint (as in
+# check_kicad_mod.py) or each with its own context
+def allRules(module, shared):
+    module.graphicsChanged()
+    result = []
+    for name in rules.__all__:
+        rule = getattr(rules, name).Rule(module, None)
+        if not shared:
+            rule.context = FootprintContext(module)
+        result.append((rule.check(), rule.messageBuffer))
+    return result
+
+def intersections(rule):
+    rule.check()
+    return [(id(i['pad']), id(i['graph'])) for i in rule.intersections]
+
+def benchmark(name, module):
+    global mismatch
+
+    printer.green("{n}: {p} pads, {g} silkscreen graphics".format(n=name, p=len(module.pads), g=len(module.filterGraphs('F.SilkS') + module.filterGraphs('B.SilkS'))))
+
+    # Rule 7.3, silkscreen / pad intersections
+    found = intersections(rule7_3.Rule(module, None))
+    if found != intersections(rule7_3AllPads(module)):
+        printer.red("Rule 7.3 intersections differ")
+        mismatch += 1
+
+    report('rule 7.3', best(lambda: rule7_3AllPads(module).check()), best(lambda: rule7_3.Rule(module, None).check()))
+
+    # All the rules, with the derived data of the footprint shared or not
+    if allRules(module, True) != allRules(module, False):
+        printer.red("Shared context results differ")
+        mismatch += 1
+
+    report('all rules', best(lambda: allRules(module, False)), best(lambda: allRules(module, True)))
+
+    # Graphics of the layers used by rules 7.3, 7.4 and 7.5
+    if layerQueries(module) != layerQueriesScan(module):
+        printer.red("Layer queries differ")
+        mismatch += 1
+
+    report('layers', best(lambda: layerQueriesScan(module)), best(lambda: layerQueries(module)))
+
+    # Rules 8.3, 9.4 and 9.6, pad type filters and pad bounds
+    if module.padTable is None:
+        printer.yellow("No pad table (NumPy is not installed or the footprint is small)")
+    else:
+        if padChecksWithTable(module) != padChecksWithoutTable(module):
+            printer.red("Pad table results differ")
+            mismatch += 1
+
+        report('pad table', best(lambda: padChecksWithoutTable(module)), best(lambda: padChecksWithTable(module)))
+
+tmpdir = tempfile.mkdtemp()
+try:
+    filename = os.path.join(tmpdir, 'synthetic.kicad_mod')
+    syntheticFootprint(filename, args.pads, args.graphs, args.seed)
+    benchmark("synthetic footprint", KicadMod(filename))
+finally:
+    shutil.rmtree(tmpdir)
+
+for filename in files:
+    benchmark(filename, KicadMod(filename))
+
+sys.exit(mismatch)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""
+
+This file benchmarks the s-expression parser engines against each other.
+All engines must produce identical output for every file.
+
+The streaming reader (iter_sexp) must give the same lists as parse_sexp,
+whatever the chunk size.
+
+The s-expression writer (SexprBuilder, used by KicadMod.save) is benchmarked
+too, saving the footprints must be stable (save, load and save again gives
+the same file, apart from the edit timestamp).
+
+example of use: ./bench_sexpr.py `find /usr/share/kicad/footprints -name *.kicad_mod`
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import re
+import sys, os
+import shutil
+import tempfile
+import timeit
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+common = os.path.abspath(os.path.join(sys.path[0], '..','common'))
+
+if not common in sys.path:
+    sys.path.append(common)
+
+import sexpr
+from kicad_mod import KicadMod
+from print_color import *
+
+# enable windows wildcards
+from glob import glob
+
+parser = argparse.ArgumentParser(description='Benchmark the s-expression parser engines on footprint files (.kicad_mod)')
+parser.add_argument('kicad_mod_files', nargs='+')
+parser.add_argument('-n', '--repeat', help='number of timing runs per engine (best run is reported)', type=int, default=3)
+parser.add_argument('--nocolor', help='does not use colors to show the output', action='store_true')
+
+args = parser.parse_args()
+
+printer = PrintColor(use_color=not args.nocolor)
+
+files = []
+
+for f in args.kicad_mod_files:
+    files += glob(f)
+
+if len(files) == 0:
+    printer.red("File argument invalid: {f}".format(f=args.kicad_mod_files))
+    sys.exit(1)
+
+data = []
+for filename in files:
+    with open(filename) as f:
+        data.append(''.join(f.readlines()))
+
+n_chars = sum(len(d) for d in data)
+printer.green("{n} files, {c} characters".format(n=len(data), c=n_chars))
+
+# Check that all engines agree
+mismatch = 0
+for filename, d in zip(files, data):
+    results = [repr(sexpr.parse_sexp(d, engine)) for engine in sorted(sexpr.parse_engines)]
+    if len(set(results)) > 1:
+        printer.red("Engines disagree on file: {f}".format(f=filename))
+        mismatch += 1
+
+# Check that the streaming reader agrees with parse_sexp
+def treeFromEvents(events):
+    stack = []
+    out = []
+    for event, value in events:
+        if event == sexpr.ENTER_LIST:
+            stack.append(out)
+            out = []
+        elif event == sexpr.EXIT_LIST:
+            tmpout, out = out, stack.pop(-1)
+            out.append(tmpout)
+        else:
+            out.append(value)
+    return out[0]
+
+# 1 and odd sizes split the atoms and the quoted strings between chunks
+chunk_sizes = [1, 3, 7, 61, 1021, 65536]
+
+for filename, d in zip(files, data):
+    expected = repr(sexpr.parse_sexp(d))
+    for chunk_size in chunk_sizes:
+        events = sexpr.iter_sexp(StringIO(d), chunk_size)
+        if repr(treeFromEvents(events)) != expected:
+            printer.red("Streaming reader (chunk size {n}) disagrees on file: {f}".format(n=chunk_size, f=filename))
+            mismatch += 1
+
+def run(engine):
+    for d in data:
+        sexpr.parse_sexp(d, engine)
+
+times = {}
+for engine in sorted(sexpr.parse_engines):
+    times[engine] = min(timeit.repeat(lambda: run(engine), number=1, repeat=args.repeat))
+    printer.regular("{e:>8}: {t:.3f}s ({r:.1f} kchars/s)".format(
+        e = engine,
+        t = times[engine],
+        r = n_chars / times[engine] / 1000))
+
+printer.yellow("Speedup of '{e}' over 'regex': {s:.2f}x".format(
+    e = sexpr.parse_engine,
+    s = times['regex'] / times[sexpr.parse_engine]))
+
+# Writer
+
+# the edit timestamp written by KicadMod.save (the time of the save)
+tedit = re.compile(r'\(tedit [0-9A-Fa-f]+\)')
+
+modules = [KicadMod(filename) for filename in files]
+
+tmpdir = tempfile.mkdtemp()
+try:
+    first = os.path.join(tmpdir, 'first.kicad_mod')
+    second = os.path.join(tmpdir, 'second.kicad_mod')
+
+    for filename, module in zip(files, modules):
+        module.save(first)
+        KicadMod(first).save(second)
+
+        with open(first) as f1, open(second) as f2:
+            if tedit.sub('', f1.read()) != tedit.sub('', f2.read()):
+                printer.red("Saved footprint is not stable: {f}".format(f=filename))
+                mismatch += 1
+
+    def save():
+        for module in modules:
+            module.save(first)
+
+    t = min(timeit.repeat(save, number=1, repeat=args.repeat))
+    printer.regular("{e:>8}: {t:.3f}s ({r:.1f} footprints/s)".format(
+        e = 'save',
+        t = t,
+        r = len(modules) / t))
+finally:
+    shutil.rmtree(tmpdir)
+
+sys.exit(mismatch)
@@ -5,6 +5,8 @@ from __future__ import print_function
 import argparse
 
 import sys,os
+import io
+import multiprocessing
 
 common = os.path.abspath(os.path.join(sys.path[0], '..','common'))
 
@@ -15,12 +17,14 @@ from kicad_mod import *
 from print_color import *
 from rules import *
 from rules.rule import KLCRule
+from check_cache import *
+from git_changes import *
 
 # enable windows wildcards
 from glob import glob
 
 parser = argparse.ArgumentParser(description='Checks KiCad footprint files (.kicad_mod) against KiCad Library Convention (KLC v2.0) rules. You can find the KLC at https://github.com/KiCad/kicad-library/wiki/Kicad-Library-Convention')
-parser.add_argument('kicad_mod_files', nargs='+')
+parser.add_argument('kicad_mod_files', nargs='*')
 parser.add_argument('--fix', help='fix the violations if possible', action='store_true')
 parser.add_argument('--fixmore', help='fix additional violations, not covered by --fix (e.g. rectangular courtyards), implies --fix!', action='store_true')
 parser.add_argument('--rotate', help='rotate the whole symbol by the given number of degrees', action='store', default=0)
@@ -29,82 +33,105 @@ parser.add_argument('--nocolor', help='does not use colors to show the output',
 parser.add_argument('-v', '--verbose', help='Enable verbose output. -v shows brief information, -vv shows complete information', action='count')
 parser.add_argument('-s', '--silent', help='skip output for symbols passing all checks', action='store_true')
 parser.add_argument('-e', '--errors', help='Do not suppress fatal parsing errors', action='store_true')
-
-args = parser.parse_args()
-if args.fixmore:
-    args.fix=True
-
-printer = PrintColor(use_color=not args.nocolor)
-
-exit_code = 0
-
-if args.rule:
-    selected_rules = args.rule.split(",")
-else:
-    selected_rules = None
+parser.add_argument('-j', '--jobs', help='check the files using N worker processes (output is printed in input order)', type=int, default=1)
+parser.add_argument('--cache', help='store the results in a SQLite database FILE, footprints which did not change since the last run replay their cached results (ignored with --fix and --rotate)', action='store', metavar='FILE')
+parser.add_argument('--changed-since', help='check only the files added or modified since the git revision REV (or range of revisions, e.g. "master...HEAD"). If no files are given, all the changed footprints of the repository are checked', action='store', metavar='REV')
 
 # get all rules
-all_rules = []
-for f in dir():
-    if f.startswith('rule'):
-        if selected_rules == None or (f[4:].replace("_",".") in selected_rules):
-            all_rules.append(globals()[f].Rule)
-    elif f.startswith('EC'):
-        if selected_rules == None or f in selected_rules:
-            all_rules.append(globals()[f].Rule)
-
-files = []
+def getRules(selected_rules):
+    all_rules = []
+    for f in sorted(globals().keys()):
+        if f.startswith('rule'):
+            if selected_rules == None or (f[4:].replace("_",".") in selected_rules):
+                all_rules.append(globals()[f].Rule)
+        elif f.startswith('EC'):
+            if selected_rules == None or f in selected_rules:
+                all_rules.append(globals()[f].Rule)
+    return all_rules
+
+# set the options used by checkFile (called in each worker process)
+def setup(options):
+    global args, printer, all_rules, cache
+
+    args = options
+
+    printer = PrintColor(use_color=not args.nocolor)
+
+    if args.rule:
+        selected_rules = args.rule.split(",")
+    else:
+        selected_rules = None
 
-for f in args.kicad_mod_files:
-    files += glob(f)
+    all_rules = getRules(selected_rules)
 
-if len(files) == 0:
-    printer.red("File argument invalid: {f}".format(f=args.kicad_mod_files))
-    sys.exit(1)
+    # the fixes can not be replayed
+    if args.cache and not args.fix and args.rotate == 0:
+        cache = CheckCache(args.cache, all_rules)
+    else:
+        cache = None
 
-for filename in files:
+# check a single footprint file, printing the results
+# returns the value to add to the exit code
+def checkFile(filename):
 
     if not os.path.exists(filename):
         printer.red('File does not exist: %s' % filename)
-        continue
+        return 0
 
     if not filename.endswith('.kicad_mod'):
         printer.red('File is not a .kicad_mod : %s' % filename)
-        continue
+        return 0
 
-    if args.errors:
-        module = KicadMod(filename)
+    # some rules check the file name and directory
+    if cache:
+        with open(filename, 'rb') as f:
+            key = contentHash([f.read(), os.path.realpath(filename)])
+        result = cache.get(key)
     else:
-        try:
+        result = None
+
+    if result is not None:
+        # the file is not even parsed
+        name = result['name']
+        rules = [CachedRule(record) for record in result['rules']]
+
+    else:
+        if args.errors:
             module = KicadMod(filename)
-        except Exception as e:
-            printer.red('could not parse module: %s' % filename)
-            if args.verbose:
-                printer.red("Error: " + str(e))
-            exit_code += 1
-            continue
+        else:
+            try:
+                module = KicadMod(filename)
+            except Exception as e:
+                printer.red('could not parse module: %s' % filename)
+                if args.verbose:
+                    printer.red("Error: " + str(e))
+                return 1
+
+        if args.rotate!=0:
+            module.rotateFootprint(int(args.rotate))
+            printer.green('rotated footprint by {deg} degrees'.format(deg=int(args.rotate)))
 
-    if args.rotate!=0:
-        module.rotateFootprint(int(args.rotate))
-        printer.green('rotated footprint by {deg} degrees'.format(deg=int(args.rotate)))
+        name = module.name
+        rules = (rule(module, args) for rule in all_rules)
+
+    records = []
 
     n_violations = 0
 
     no_warnings = True
 
-    output = []
-
     first = True
 
-    for rule in all_rules:
-
-        rule = rule(module,args)
+    for rule in rules:
 
         error = rule.check()
 
+        if error or rule.hasOutput():
+            records.append(CheckCache.record(rule, error))
+
         if rule.hasOutput():
             if first:
-                printer.green("Checking footprint '{fp}':".format(fp=module.name))
+                printer.green("Checking footprint '{fp}':".format(fp=name))
                 first = False
 
             printer.yellow("Violating " + rule.name, indentation=2)
@@ -120,16 +147,74 @@ for filename in files:
     # No messages?
     if first:
         if not args.silent:
-            printer.green("Checking footprint '{fp}' - No errors".format(fp=module.name))
-
-    # increment the number of violations
-    if n_violations > 0:
-        exit_code += 1
+            printer.green("Checking footprint '{fp}' - No errors".format(fp=name))
 
     if args.fix or args.rotate!=0:
         module.save()
 
-if args.fix:
-    printer.light_red('Some files were updated - ensure that they still load correctly in KiCad')
+    if cache and result is None:
+        cache.put(key, {'name': name, 'rules': records})
+        cache.commit()
+
+    # increment the number of violations
+    return 1 if n_violations > 0 else 0
+
+# check a single footprint file in a worker process
+# the printed output is captured and sent back with the exit code increment
+def checkFileCaptured(filename):
+    stdout = sys.stdout
+    sys.stdout = io.StringIO() if sys.version_info[0] >= 3 else io.BytesIO()
+    try:
+        errors = checkFile(filename)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+    return {'filename': filename, 'output': output, 'errors': errors}
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.fixmore:
+        args.fix=True
+
+    setup(args)
+
+    exit_code = 0
+
+    files = []
+
+    for f in args.kicad_mod_files:
+        files += glob(f)
+
+    if args.changed_since:
+        try:
+            files = changedFiles(args.changed_since, ['.kicad_mod'], files)
+        except RuntimeError as e:
+            printer.red(str(e))
+            sys.exit(1)
+
+        if len(files) == 0:
+            if not args.silent:
+                printer.green("No footprint changed since {rev}".format(rev=args.changed_since))
+            sys.exit(0)
+
+    elif len(files) == 0:
+        printer.red("File argument invalid: {f}".format(f=args.kicad_mod_files))
+        sys.exit(1)
+
+    if args.jobs > 1 and len(files) > 1:
+        pool = multiprocessing.Pool(args.jobs, setup, (args,))
+        # imap returns the results in input order
+        for result in pool.imap(checkFileCaptured, files, chunksize=4):
+            sys.stdout.write(result['output'])
+            exit_code += result['errors']
+        pool.close()
+        pool.join()
+    else:
+        for filename in files:
+            exit_code += checkFile(filename)
+
+    if args.fix:
+        printer.light_red('Some files were updated - ensure that they still load correctly in KiCad')
 
-sys.exit(exit_code)
+    sys.exit(exit_code)
@@ -10,6 +10,8 @@ sys.path.append(os.path.join('..','common'))
 
 import sexpr
 from boundingbox import BoundingBox       
+from geometry import rotatePoint, circleBounds, arcBounds, padPolygon, pointsBox
+import pad_table
 
 # Rotate a point by given angle (in degrees)
 def _rotatePoint(point, degrees):
@@ -19,13 +21,7 @@ def _rotatePoint(point, degrees):
     for key in point:
         p[key] = point[key]
     
-    radians = degrees * math.pi / 180
-    
-    x = point['x']
-    y = point['y']
-    
-    p['x'] = x * math.cos(radians) - y * math.sin(radians)
-    p['y'] = y * math.cos(radians) + x * math.sin(radians)
+    p['x'], p['y'] = rotatePoint(point['x'], point['y'], degrees)
         
     if 'orientation' in point:
         p['orientation'] -= degrees
@@ -46,11 +42,34 @@ def _movePoint(point, offset):
     
     return p
 
+class _cachedProperty(object):
+    """
+    Build an attribute on first access and store it in the instance, so
+    later accesses (and assignments) go straight to the instance attribute
+    """
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.func.__name__] = self.func(obj)
+        return value
+
 class KicadMod(object):
     """
     A class to parse kicad_mod files format of the KiCad
+
+    If lazy is True only the header data (name, layer, description, tags,
+    attributes, etc.) is extracted when loading. The texts, graphics, pads
+    and models are then extracted on first access.
     """
-    def __init__(self, filename):
+
+    # collections which are extracted on first access in lazy mode
+    _LAZY_ATTRIBUTES = ['reference', 'value', 'userText', 'lines', 'circles', 'arcs', 'pads', 'models']
+
+    def __init__(self, filename, lazy=False):
         self.filename = filename
         
         # check file line-endings
@@ -67,6 +86,13 @@ class KicadMod(object):
         sexpr_data = sexpr.parse_sexp(sexpr_data)
         self.sexpr_data = sexpr_data
 
+        # index of the s-expression data, built on first lookup
+        self._index = None
+
+        # incremented when the pads or the graphics change, for the data
+        # derived from them (see padsChanged and graphicsChanged)
+        self.revision = 0
+
         # module name
         self.name = self.sexpr_data[1]
 
@@ -95,29 +121,96 @@ class KicadMod(object):
         # attribute
         self.attribute =  self._getValue('attr', 'pth', 2)
 
-        # reference
-        self.reference = self._getText('reference')[0]
-
-        # value
-        self.value = self._getText('value')[0]
-
-        # user text
-        self.userText = self._getText('user')
-
-        # lines
-        self.lines = self._getLines()
-
-        # circles
-        self.circles = self._getCircles()
-
-        # arcs
-        self.arcs = self._getArcs()
-
-        # pads
-        self.pads = self._getPads()
-
-        # models
-        self.models = self._getModels()
+        # texts, graphics, pads and models
+        if not lazy:
+            for attribute in self._LAZY_ATTRIBUTES:
+                getattr(self, attribute)
+
+    # reference
+    @_cachedProperty
+    def reference(self):
+        return self._getText('reference')[0]
+
+    # value
+    @_cachedProperty
+    def value(self):
+        return self._getText('value')[0]
+
+    # user text
+    @_cachedProperty
+    def userText(self):
+        return self._getText('user')
+
+    # lines
+    @_cachedProperty
+    def lines(self):
+        return self._getLines()
+
+    # circles
+    @_cachedProperty
+    def circles(self):
+        return self._getCircles()
+
+    # arcs
+    @_cachedProperty
+    def arcs(self):
+        return self._getArcs()
+
+    # pads
+    @_cachedProperty
+    def pads(self):
+        return self._getPads()
+
+    # models
+    @_cachedProperty
+    def models(self):
+        return self._getModels()
+
+    # lines, circles and arcs by layer, as {layer: {'lines': [...], ...}}
+    @_cachedProperty
+    def _graphicsByLayer(self):
+        buckets = {}
+        for kind, items in [('lines', self.lines), ('circles', self.circles), ('arcs', self.arcs)]:
+            for item in items:
+                layer = item['layer']
+                if not layer in buckets:
+                    buckets[layer] = {'lines': [], 'circles': [], 'arcs': []}
+                buckets[layer][kind].append(item)
+        return buckets
+
+    # drop the graphics by layer, call it after adding, removing or changing graphics
+    def graphicsChanged(self):
+        self.__dict__.pop('_graphicsByLayer', None)
+        self.revision += 1
+
+    # the graphics of a kind ('lines', 'circles' or 'arcs') on a layer
+    def _layerGraphics(self, kind, layer):
+        bucket = self._graphicsByLayer.get(layer)
+        if bucket is None:
+            return []
+        return list(bucket[kind])
+
+    # pads as a structured array (see pad_table.py), None without NumPy or
+    # for small footprints
+    @_cachedProperty
+    def padTable(self):
+        if pad_table.numpy is None or len(self.pads) < pad_table.MIN_PADS:
+            return None
+        return pad_table.PadTable(self.pads)
+
+    # drop the pad table, call it after changing the pads
+    def padsChanged(self):
+        self.__dict__.pop('padTable', None)
+        self.revision += 1
+
+    # the pad table, if it can be used for the given pads (None for all the pads)
+    def _padTableFor(self, pads):
+        if pads is not None:
+            return None
+        table = self.padTable
+        if table is None or len(table) != len(self.pads):
+            return None
+        return table
 
     # check if value exists in any element of data
     def _hasValue(self, data, value):
@@ -129,6 +222,12 @@ class KicadMod(object):
                 return True
         return False
 
+    # return the index of the s-expression data
+    def _getIndex(self):
+        if self._index is None:
+            self._index = sexpr.SexprIndex(self.sexpr_data)
+        return self._index
+
     # return the array which has value as first element
     def _getArray(self, data, value, result=None, level=0, max_level = None):
         if result is None: result = []
@@ -137,6 +236,12 @@ class KicadMod(object):
         
         if max_level is not None and max_level <= level:
             return result
+
+        # lists of the s-expression data are looked up in the index
+        index = self._getIndex()
+        if index.indexed(data):
+            result += index.find(value, data)
+            return result
         
         for i in data:
             if type(i) == type([]):
@@ -156,6 +261,7 @@ class KicadMod(object):
             index = self.sexpr_data.index(found_array[0])
             self.sexpr_data.pop(index)
             self.sexpr_data.insert(index, array)
+            self._index = None
         else:
             self._createArray(array, place_after)
 
@@ -173,6 +279,7 @@ class KicadMod(object):
         else:
             # case doesn't find any desired position, append to end of the array
             self.sexpr_data.append(new_array)
+        self._index = None
 
     # return the second element of the array because the array is expected
     # to have the following format: [key value]
@@ -234,7 +341,7 @@ class KicadMod(object):
         lines = []
         for line in self._getArray(self.sexpr_data, 'fp_line'):
             line_dict = {}
-            if self._hasValue(line, layer) or layer == None:
+            if layer == None or self._hasValue(line, layer):
                 a = self._getArray(line, 'start')[0]
                 line_dict['start'] = {'x':a[1], 'y':a[2]}
 
@@ -262,7 +369,7 @@ class KicadMod(object):
         for circle in self._getArray(self.sexpr_data, 'fp_circle'):
             circle_dict = {}
             # filter layers, None = all layers
-            if self._hasValue(circle, layer) or layer == None:
+            if layer == None or self._hasValue(circle, layer):
                 a = self._getArray(circle, 'center')[0]
                 circle_dict['center'] = {'x':a[1], 'y':a[2]}
 
@@ -290,7 +397,7 @@ class KicadMod(object):
         for arc in self._getArray(self.sexpr_data, 'fp_arc'):
             arc_dict = {}
             # filter layers, None = all layers
-            if self._hasValue(arc, layer) or layer == None:
+            if layer == None or self._hasValue(arc, layer):
                 a = self._getArray(arc, 'start')[0]
                 arc_dict['start'] = {'x':a[1], 'y':a[2]}
 
@@ -350,6 +457,11 @@ class KicadMod(object):
                 # offset
                 pad_dict['drill']['offset'] = {}
                 offset = self._getArray(drill, 'offset')
+
+                # the offset and the shape are removed from a copy, the parsed
+                # data (and its index) must not change
+                drill = list(drill)
+
                 if offset:
                     offset = offset[0]
                     pad_dict['drill']['offset'] = {'x':offset[1], 'y':offset[2]}
@@ -452,6 +564,7 @@ class KicadMod(object):
                'width': width
              }
         self.lines.append( line)
+        self.graphicsChanged()
 
     def addRectangle(self, start, end, layer, width):
         self.addLine( [ start[0], start[1] ], [ end[0], start[1] ], layer, width)
@@ -499,6 +612,8 @@ class KicadMod(object):
         for pad in self.pads:
             pad['pos']['x'] -= anchor_point[0]
             pad['pos']['y'] -= anchor_point[1]
+        self.padsChanged()
+        self.graphicsChanged()
             
         # change models
         for model in self.models:
@@ -537,6 +652,8 @@ class KicadMod(object):
         # change pads positions
         for pad in self.pads:
             pad['pos']=_rotatePoint(pad['pos'], degrees)
+        self.padsChanged()
+        self.graphicsChanged()
             
         # change models
         for model in self.models:
@@ -544,28 +661,13 @@ class KicadMod(object):
             model['rotate']['z']=model['rotate']['z']-degrees
 
     def filterLines(self, layer):
-        lines = []
-        for line in self.lines:
-            if line['layer'] == layer:
-                lines.append(line)
-
-        return lines
+        return self._layerGraphics('lines', layer)
 
     def filterCircles(self, layer):
-        circles = []
-        for circle in self.circles:
-            if circle['layer'] == layer:
-                circles.append(circle)
-
-        return circles
+        return self._layerGraphics('circles', layer)
 
     def filterArcs(self, layer):
-        arcs = []
-        for arc in self.arcs:
-            if arc['layer'] == layer:
-                arcs.append(arc)
-
-        return arcs
+        return self._layerGraphics('arcs', layer)
        
     # Return the geometric bounds for a given layer
     # Includes lines, arcs, circles
@@ -592,40 +694,16 @@ class KicadMod(object):
             
             r = math.sqrt(dx*dx + dy*dy)
             
-            bb.addPoint(cx, cy, radius=r)
+            x1, y1, x2, y2 = circleBounds(cx, cy, r)
+            bb.addPoint(x1, y1)
+            bb.addPoint(x2, y2)
             
-        # Add all arcs
+        # Add all arcs (start is the center, end the first point of the arc)
         arcs=self.filterArcs(layer)
         for c in arcs:
-            cx = c['start']['x']
-            cy = c['start']['y']
-            ex = c['end']['x']
-            ey = c['end']['y']
-            
-            dx = ex - cx
-            dy = ey - cy
-            
-            r = math.sqrt(dx*dx + dy*dy)
-            
-            dalpha=1
-            alphaend=c['angle']
-            if math.fabs(alphaend)<1:
-                dalpha=math.fabs(alphaend)/5
-            if alphaend<0:
-                dalpha=-dalpha
-            if math.fabs(alphaend)>0:
-                a=0
-                c0=[ ex - cx, ey - cy ]
-                #print("c0 = ",c0)
-                while (alphaend>0 and a<=alphaend) or (alphaend<0 and a>=alphaend):
-                    c1=[0,0]
-                    c1[0]=math.cos(a/180*3.1415)*c0[0]-math.sin(a/180*3.1415)*c0[1]
-                    c1[1]=math.sin(a/180*3.1415)*c0[0]+math.cos(a/180*3.1415)*c0[1]
-                    
-                    bb.addPoint(cx + c1[0], cy + c1[1])
-                    a=a+dalpha
-                
-            bb.addPoint(ex, None)
+            x1, y1, x2, y2 = arcBounds(c['start']['x'], c['start']['y'], c['end']['x'], c['end']['y'], c['angle'])
+            bb.addPoint(x1, y1)
+            bb.addPoint(x2, y2)
 
         return bb
         
@@ -644,6 +722,10 @@ class KicadMod(object):
         return pads
 
     def filterPads(self, pad_type):
+        table = self._padTableFor(None)
+        if table is not None:
+            return table.filter(pad_type)
+
         pads = []
         for pad in self.pads:
             if pad['type'] == pad_type:
@@ -662,6 +744,10 @@ class KicadMod(object):
 
     def padsBounds(self, pads=None):
         
+        table = self._padTableFor(pads)
+        if table is not None:
+            return BoundingBox(*table.positionBounds())
+
         bb = BoundingBox()
     
         if pads == None:
@@ -675,35 +761,20 @@ class KicadMod(object):
         
     def overpadsBounds(self, pads=None):
     
+        table = self._padTableFor(pads)
+        if table is not None:
+            return BoundingBox(*table.outlineBounds())
+
         bb = BoundingBox()
         
         if pads == None:
             pads = self.pads
             
+        # Add the corners of each pad (even for oval shapes)
         for pad in pads:
-            pos = pad['pos']
-            px = pos['x']
-            py = pos['y']
-            
-            # Pad outer dimensions
-            sx = pad['size']['x']
-            sy = pad['size']['y']
-            
-            angle = pad['pos']['orientation']
-            
-            # Add each "corner" of the pad (even for oval shapes)
-            
-            p1 = _rotatePoint({'x': -sx/2, 'y': -sy/2}, angle)
-            p2 = _rotatePoint({'x': -sx/2, 'y': +sy/2}, angle)
-            p3 = _rotatePoint({'x': +sx/2, 'y': +sy/2}, angle)
-            p4 = _rotatePoint({'x': +sx/2, 'y': -sy/2}, angle)
-            
-            points = [p1, p2, p3, p4]
-            
-            for p in points:
-                x = px + p['x']
-                y = py + p['y']
-                bb.addPoint(x,y)
+            x1, y1, x2, y2 = pointsBox(padPolygon(pad))
+            bb.addPoint(x1, y1)
+            bb.addPoint(x2, y2)
                         
         return bb
         
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+A columnar view of the pads of a footprint (KicadMod.pads), as a NumPy
+structured array, so the pads can be checked with array operations:
+
+    table = module.padTable
+    if table is not None:
+        a = table.array
+        pads = table.select(table.typeMask('thru_hole') & (a['size_x'] < 1))
+
+The rows are in the order of KicadMod.pads. The type, shape and layers of the
+pads are stored as codes, indices in table.types, table.shapes and
+table.layer_sets. A pad without drill size has NaN drill_x and drill_y, a pad
+without drill offset has a zero offset.
+
+NumPy is optional: without it KicadMod.padTable is None and the callers use
+the pad dictionaries. It is None too for footprints with less than MIN_PADS
+pads, the pad dictionaries are faster there.
+
+"""
+
+from __future__ import division
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from geometry import rotation
+
+# smallest footprint with a pad table
+MIN_PADS = 64
+
+PAD_DTYPE = [
+    ('x', 'f8'),
+    ('y', 'f8'),
+    ('orientation', 'f8'),
+    ('size_x', 'f8'),
+    ('size_y', 'f8'),
+    ('drill_x', 'f8'),
+    ('drill_y', 'f8'),
+    ('offset_x', 'f8'),
+    ('offset_y', 'f8'),
+    ('type', 'i4'),
+    ('shape', 'i4'),
+    ('layers', 'i4'),
+    ]
+
+# the code of value in values, value is appended to values if needed
+def _code(codes, values, value):
+    try:
+        return codes[value]
+    except KeyError:
+        code = codes[value] = len(values)
+        values.append(value)
+        return code
+
+class PadTable(object):
+    """
+    Structured array of the pads of a footprint, built once from the pad dictionaries
+    """
+    def __init__(self, pads):
+        self.pads = pads
+
+        self.types = []
+        self.shapes = []
+        self.layer_sets = []
+
+        type_codes = {}
+        shape_codes = {}
+        layer_codes = {}
+
+        nan = float('nan')
+
+        rows = []
+        for pad in pads:
+            pos = pad['pos']
+            size = pad['size']
+            drill = pad['drill']
+
+            drill_x = drill_y = nan
+            if 'size' in drill and drill['size']:
+                drill_x = drill['size']['x']
+                drill_y = drill['size']['y']
+
+            offset_x = offset_y = 0
+            if 'offset' in drill and 'x' in drill['offset']:
+                offset_x = drill['offset']['x']
+                offset_y = drill['offset']['y']
+
+            rows.append((pos['x'], pos['y'], pos['orientation'],
+                         size['x'], size['y'],
+                         drill_x, drill_y, offset_x, offset_y,
+                         _code(type_codes, self.types, pad['type']),
+                         _code(shape_codes, self.shapes, pad['shape']),
+                         _code(layer_codes, self.layer_sets, tuple(pad['layers']))))
+
+        self.array = numpy.array(rows, dtype=PAD_DTYPE)
+
+        # order of KicadMod.filterPads
+        self.order = numpy.array(sorted(range(len(pads)), key=lambda i: str(pads[i]['number'])), dtype=numpy.intp)
+
+    def __len__(self):
+        return len(self.array)
+
+    # mask of the pads of a type
+    def typeMask(self, pad_type):
+        if not pad_type in self.types:
+            return numpy.zeros(len(self.array), dtype=bool)
+
+        return self.array['type'] == self.types.index(pad_type)
+
+    # mask of the pads of a shape
+    def shapeMask(self, shape):
+        if not shape in self.shapes:
+            return numpy.zeros(len(self.array), dtype=bool)
+
+        return self.array['shape'] == self.shapes.index(shape)
+
+    # mask of the pads whose list of layers matches test(layers)
+    # test is called once per distinct list of layers
+    def layersMask(self, test):
+        matching = [code for code, layers in enumerate(self.layer_sets) if test(list(layers))]
+        return numpy.isin(self.array['layers'], matching)
+
+    # mask of the pads without drill size
+    def noDrillMask(self):
+        return numpy.isnan(self.array['drill_x'])
+
+    # the pad dictionaries selected by a mask, sorted by number like KicadMod.filterPads
+    def select(self, mask):
+        pads = self.pads
+        return [pads[i] for i in self.order[mask[self.order]]]
+
+    # the pads of a type, same result as KicadMod.filterPads
+    def filter(self, pad_type):
+        return self.select(self.typeMask(pad_type))
+
+    # the box (x1, y1, x2, y2) of the pad positions
+    def positionBounds(self):
+        a = self.array
+        return (float(a['x'].min()), float(a['y'].min()), float(a['x'].max()), float(a['y'].max()))
+
+    # the box (x1, y1, x2, y2) of the rotated pad outlines, see geometry.padPolygon
+    def outlineBounds(self):
+        a = self.array
+
+        # the same cos and sin as geometry.rotation, for each distinct orientation
+        angles, inverse = numpy.unique(a['orientation'], return_inverse=True)
+        rotations = numpy.array([rotation(float(angle)) for angle in angles]).reshape(-1, 2)
+        cos = rotations[inverse, 0]
+        sin = rotations[inverse, 1]
+
+        hx = a['size_x'] / 2
+        hy = a['size_y'] / 2
+
+        xs = []
+        ys = []
+        for x, y in [(-hx, -hy), (-hx, hy), (hx, hy), (hx, -hy)]:
+            xs.append(a['x'] + (x * cos - y * sin))
+            ys.append(a['y'] + (y * cos + x * sin))
+
+        return (float(min(x.min() for x in xs)), float(min(y.min() for y in ys)),
+                float(max(x.max() for x in xs)), float(max(y.max() for y in ys)))
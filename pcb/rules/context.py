@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""
+
+The data derived from a footprint which several rules use (graphics of a
+layer, pads of a type, pad and graphic bounds), computed on first use and
+shared by all the rules checking the footprint:
+
+    context = FootprintContext.of(module)
+    silk = context.filterGraphs('F.SilkS')
+
+The methods have the names and results of the KicadMod methods. They return
+copies, so a rule can change the results (e.g. expand a bounding box) without
+changing what the other rules get.
+
+The values are dropped when the pads or the graphics of the footprint change
+(KicadMod.padsChanged and KicadMod.graphicsChanged), e.g. by a fix.
+
+"""
+
+class FootprintContext(object):
+    """
+    Memoized derived data of a footprint, shared by the rules
+    """
+    def __init__(self, module):
+        self.module = module
+        self.revision = module.revision
+        self.values = {}
+
+    # the context of a footprint, created with the first rule checking it
+    @staticmethod
+    def of(module):
+        context = module.__dict__.get('context')
+        if context is None:
+            context = module.context = FootprintContext(module)
+        return context
+
+    # the result of module.method(*args), computed once per revision of the footprint
+    def _get(self, method, *args):
+        if self.revision != self.module.revision:
+            self.values = {}
+            self.revision = self.module.revision
+
+        key = (method,) + args
+        try:
+            return self.values[key]
+        except KeyError:
+            value = self.values[key] = getattr(self.module, method)(*args)
+            return value
+
+    def filterLines(self, layer):
+        return list(self._get('filterLines', layer))
+
+    def filterGraphs(self, layer):
+        return list(self._get('filterGraphs', layer))
+
+    def filterPads(self, pad_type):
+        return list(self._get('filterPads', pad_type))
+
+    def getPadsByNumber(self, pad_number):
+        return list(self._get('getPadsByNumber', pad_number))
+
+    def overpadsBounds(self):
+        return self._get('overpadsBounds').copy()
+
+    def geometricBoundingBox(self, layer):
+        return self._get('geometricBoundingBox', layer).copy()
+
+    def padMiddlePosition(self):
+        return dict(self._get('padMiddlePosition'))
@@ -20,4 +20,7 @@ KLC_TEXT_SIZE_MAX = 2.00
 # text thicknesss
 KLC_TEXT_THICKNESS = 0.15
 KLC_TEXT_THICKNESS_MIN = 0.025
-KLC_TEXT_THICKNESS_MAX = 0.20
\ No newline at end of file
+KLC_TEXT_THICKNESS_MAX = 0.20
+
+# pads
+KLC_MIN_ANNULAR_RING = 0.15
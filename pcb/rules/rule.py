@@ -9,6 +9,7 @@ if not common in sys.path:
     sys.path.append(common)
     
 from rulebase import *
+from rules.context import FootprintContext
 
 def mapToGrid(dimension, grid):
     return round(dimension / grid) * grid
@@ -87,6 +88,9 @@ class KLCRule(KLCRuleBase):
     
         self.module = module
         self.args = args
+
+        # derived data of the footprint, shared by all the rules
+        self.context = FootprintContext.of(module)
         
         # Illegal chars
         self.illegal_chars = ['*', '?', ':', '/', '\\', '[', ']', ';', '|', '=', ',']
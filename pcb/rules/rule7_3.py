@@ -4,7 +4,10 @@ from __future__ import division
 
 from rules.rule import *
 from rules.klc_constants import *
+from grid_index import GridIndex
+from geometry import growBox, pointsBox, circleBounds, padReach, circleIntersectsPad, segmentIntersectsPad
 import cmath
+import math
 
 class Rule(KLCRule):
     """
@@ -68,6 +71,41 @@ class Rule(KLCRule):
             if graph['width'] not in KLC_SILK_WIDTH_ALLOWED:
                 self.bad_width.append(graph)
              
+    """
+    The area where a pad can be found intersecting a silkscreen graphic
+    """
+    def padBox(self, pad):
+        reach = padReach(pad)
+        return growBox(pointsBox([(pad['pos']['x'], pad['pos']['y'])]), reach)
+
+    """
+    Grid index of the pad areas, so only the pads near a graphic are checked
+    """
+    def padIndex(self):
+        boxes = [self.padBox(pad) for pad in self.module.pads]
+
+        # cells of the average size of the pads
+        size = sum(box[2] - box[0] for box in boxes) / len(boxes)
+
+        index = GridIndex(size)
+        for box in boxes:
+            index.add(box)
+
+        return index
+
+    """
+    The pads (in the footprint order) which may intersect a graphic
+    """
+    def padsNear(self, graph):
+        if 'center' in graph:
+            radius = math.hypot(graph['end']['x'] - graph['center']['x'], graph['end']['y'] - graph['center']['y'])
+            box = circleBounds(graph['center']['x'], graph['center']['y'], radius)
+        else:
+            box = pointsBox([(graph['start']['x'], graph['start']['y']), (graph['end']['x'], graph['end']['y'])])
+
+        pads = self.module.pads
+        return [pads[n] for n in self.pad_index.query(box)]
+
     """ 
     Check if any of the silkscreen intersects
     with pads, etc
@@ -75,122 +113,30 @@ class Rule(KLCRule):
     def checkIntersections(self):
     
         module = self.module
+
+        graphs = self.f_silk + self.b_silk
+
+        if not graphs or not module.pads:
+            return
+
+        self.pad_index = self.padIndex()
     
-        for graph in (self.f_silk + self.b_silk):
+        for graph in graphs:
             if 'angle' in graph:
                 #TODO
                 pass
             elif 'center' in graph:
-                for pad in module.pads:
-                    padComplex = complex(pad['pos']['x'], pad['pos']['y'])
-                    padOffset = 0 + 0j
-                    if 'offset' in pad['drill']:
-                        if 'x' in pad['drill']['offset']:
-                            padOffset = complex(pad['drill']['offset']['x'], pad['drill']['offset']['y'])
-
-                    edgesPad = {}
-                    edgesPad[0] = complex(pad['size']['x'] / 2.0, pad['size']['y'] / 2.0) + padComplex + padOffset
-                    edgesPad[1] = complex(-pad['size']['x'] / 2.0, -pad['size']['y'] / 2.0) + padComplex + padOffset
-                    edgesPad[2] = complex(pad['size']['x'] / 2.0, -pad['size']['y'] / 2.0) + padComplex + padOffset
-                    edgesPad[3] = complex(-pad['size']['x'] / 2.0, pad['size']['y'] / 2.0) + padComplex + padOffset
-
-                    vectorR = cmath.rect(1, cmath.pi / 180 * pad['pos']['orientation'])
-                    for i in range(4):
-                        edgesPad[i] = (edgesPad[i] - padComplex) * vectorR + padComplex
-
-                    centerComplex = complex(graph['center']['x'], graph['center']['y'])
-                    endComplex = complex(graph['end']['x'], graph['end']['y'])
-                    radius = abs(endComplex - centerComplex)
-                    if 'circle' in pad['shape']:
-                        distance = radius + pad['size']['x'] / 2.0 + 0.075
-                        if (abs(centerComplex - padComplex) < distance and
-                            abs(centerComplex - padComplex) > abs(-radius + pad['size']['x'] / 2.0 + 0.075)):
-                            self.intersections.append({'pad':pad, 'graph':graph})
-                    else:
-                        # if there are edges inside and outside the circle, we have an intersection
-                        edgesInside = []
-                        edgesOutside = []
-                        for i in range(4):
-                            if abs(centerComplex - edgesPad[i]) < radius:
-                                edgesInside.append(edgesPad[i])
-                            else:
-                                edgesOutside.append(edgesPad[i])
-                        if edgesInside and edgesOutside:
-                            self.intersections.append({'pad':pad, 'graph':graph})
+                center = (graph['center']['x'], graph['center']['y'])
+                end = (graph['end']['x'], graph['end']['y'])
+                for pad in self.padsNear(graph):
+                    if circleIntersectsPad(center, end, pad):
+                        self.intersections.append({'pad':pad, 'graph':graph})
             else:
-                for pad in module.pads:
-                    padComplex = complex(pad['pos']['x'], pad['pos']['y'])
-                    padOffset = 0 + 0j
-                    if 'offset' in pad['drill']:
-                        if 'x' in pad['drill']['offset']:
-                            padOffset = complex(pad['drill']['offset']['x'], pad['drill']['offset']['y'])
-                            
-                    edgesPad = {}
-                    edgesPad[0] = complex(pad['size']['x'] / 2.0, pad['size']['y'] / 2.0) + padComplex + padOffset
-                    edgesPad[1] = complex(-pad['size']['x'] / 2.0, -pad['size']['y'] / 2.0) + padComplex + padOffset
-                    edgesPad[2] = complex(pad['size']['x'] / 2.0, -pad['size']['y'] / 2.0) + padComplex + padOffset
-                    edgesPad[3] = complex(-pad['size']['x'] / 2.0, pad['size']['y'] / 2.0) + padComplex + padOffset
-                    
-                    vectorR = cmath.rect(1, cmath.pi / 180 * pad['pos']['orientation'])
-                    for i in range(4):
-                        edgesPad[i] = (edgesPad[i] - padComplex) * vectorR + padComplex
-                        
-                    startComplex = complex(graph['start']['x'], graph['start']['y'])
-                    endComplex = complex(graph['end']['x'], graph['end']['y'])
-                    if endComplex.imag > startComplex.imag:
-                        vector = endComplex - startComplex
-                        padComplex = padComplex - startComplex
-                        for i in range(4):
-                            edgesPad[i] = edgesPad[i] - startComplex
-                    else:
-                        vector = startComplex - endComplex
-                        padComplex = padComplex - endComplex
-                        for i in range(4):
-                            edgesPad[i] = edgesPad[i] - endComplex
-                    length = abs(vector)
-                    
-                    vectorR = cmath.rect(1, -cmath.phase(vector))
-                    padComplex = padComplex * vectorR
-                    for i in range(4):
-                            edgesPad[i] = edgesPad[i] * vectorR
-                    
-                    if 'circle' in pad['shape']:
-                        distance = cmath.sqrt((pad['size']['x'] / 2.0) ** 2 - (padComplex.imag) ** 2).real
-                        padMinX = padComplex.real - distance
-                        padMaxX = padComplex.real + distance
-                    else:
-                        edges = [[0,3],[0,2],[2,1],[1,3]] #lines of the rectangle pads
-                        x0 = [] #vector of value the x to y=0
-                        for edge in edges:
-                            x1 = edgesPad[edge[0]].real
-                            x2 = edgesPad[edge[1]].real
-                            y1 = edgesPad[edge[0]].imag
-                            y2 = edgesPad[edge[1]].imag
-                            if y1 != y2:
-                                x = -y1 / (y2 - y1) * (x2 - x1) + x1
-                                if x < max(x1, x2) and x > min(x1, x2):
-                                    x0.append(x)
-                        if x0:
-                            padMinX = min(x0)
-                            padMaxX = max(x0)
-                        else:
-                            continue
-                    if ((padMinX < length and padMinX > 0) or
-                        (padMaxX < length and padMaxX > 0) or
-                        (padMaxX > length and padMinX < 0)) :
-                        if 'circle' in pad['shape']:
-                            distance = pad['size']['x'] / 2.0
-                            padMin = padComplex.imag - distance
-                            padMax = padComplex.imag + distance
-                        else:
-                            padMin = min(edgesPad[0].imag, edgesPad[1].imag, edgesPad[2].imag, edgesPad[3].imag)
-                            padMax = max(edgesPad[0].imag, edgesPad[1].imag, edgesPad[2].imag, edgesPad[3].imag)
-                        try:
-                            differentSign = padMax / padMin
-                        except:
-                            differentSign = padMin / padMax
-                        if (differentSign < 0) or (abs(padMax) < 0.075) or (abs(padMin) < 0.075):
-                            self.intersections.append({'pad':pad, 'graph':graph})
+                start = (graph['start']['x'], graph['start']['y'])
+                end = (graph['end']['x'], graph['end']['y'])
+                for pad in self.padsNear(graph):
+                    if segmentIntersectsPad(start, end, pad):
+                        self.intersections.append({'pad':pad, 'graph':graph})
 
     def check(self):
         """
@@ -200,9 +146,9 @@ class Rule(KLCRule):
             * b_silk
             * bad_width
         """
-        module = self.module
-        self.f_silk = module.filterGraphs('F.SilkS')
-        self.b_silk = module.filterGraphs('B.SilkS')
+        context = self.context
+        self.f_silk = context.filterGraphs('F.SilkS')
+        self.b_silk = context.filterGraphs('B.SilkS')
 
         self.checkReference()
         self.checkSilkscreenWidth()
@@ -301,9 +247,14 @@ class Rule(KLCRule):
                             graph2['start'].update({'x':round(padComplex.real, 3)})
                             graph2['start'].update({'y':round(padComplex.imag, 3)})
                             module.lines.append(graph2)
+                            module.graphicsChanged()
                     elif padMin < 0 and padMax > 0 and padMax < length:
                         padComplex = (padMax + 0j) * cmath.rect(1, phase) + startComplex
                         graph['start']['x'] = round(padComplex.real, 3)
                         graph['start']['y'] = round(padComplex.imag, 3)
                     elif (padMax > length and padMin < 0):
                         module.lines.remove(graph)
+                        module.graphicsChanged()
+
+            # the silkscreen lines were moved
+            module.graphicsChanged()
@@ -165,11 +165,12 @@ class Rule(KLCRule):
         self.missing_second_ref = False
         
         module = self.module
-        self.f_fabrication_all = module.filterGraphs('F.Fab')
-        self.b_fabrication_all = module.filterGraphs('B.Fab')
+        context = self.context
+        self.f_fabrication_all = context.filterGraphs('F.Fab')
+        self.b_fabrication_all = context.filterGraphs('B.Fab')
 
-        self.f_fabrication_lines = module.filterLines('F.Fab')
-        self.b_fabrication_lines = module.filterLines('B.Fab')
+        self.f_fabrication_lines = context.filterLines('F.Fab')
+        self.b_fabrication_lines = context.filterLines('B.Fab')
                 
         self.missing_value = self.checkMissingValue()
         self.missing_lines = self.checkMissingLines()
@@ -206,11 +207,11 @@ class Rule(KLCRule):
             
         if self.missing_second_ref:
             # Best-guess for pos is midpoint the footprint bounds
-            bounds = module.geometricBoundingBox('F.Fab')
+            bounds = self.context.geometricBoundingBox('F.Fab')
             
             # Can't get fab outline? Use pads
             if not bounds.valid:
-                bounds = module.overpadsBounds()
+                bounds = self.context.overpadsBounds()
             
             if bounds.valid:
                 pos = bounds.center
@@ -24,16 +24,16 @@ class Rule(KLCRule):
         
     # Get the superposed boundary of pads and fab layer
     def getFootprintBounds(self):
-        module = self.module
+        context = self.context
         
-        padBounds = module.overpadsBounds()
+        padBounds = context.overpadsBounds()
         
         # Try getting bounds from these layers, in order
         layers = ['F.Fab', 'B.Fab', 'F.Silk', 'B.Silk']
         
         # Accept first valid layer
         for layer in layers:
-            geo = module.geometricBoundingBox(layer)
+            geo = context.geometricBoundingBox(layer)
             if geo.valid:
                 break
         
@@ -118,8 +118,8 @@ class Rule(KLCRule):
         self.bad_grid  = []
         self.bad_width = []
         
-        self.fCourtyard = module.filterGraphs('F.CrtYd')
-        self.bCourtyard = module.filterGraphs('B.CrtYd')
+        self.fCourtyard = self.context.filterGraphs('F.CrtYd')
+        self.bCourtyard = self.context.filterGraphs('B.CrtYd')
         
         # Check for existence of courtyard
         if len(self.fCourtyard) == 0:
@@ -203,6 +203,9 @@ class Rule(KLCRule):
             item['end']['x'] = mapToGrid(item['end']['x'], KLC_CRTYD_GRID)
             item['end']['y'] = mapToGrid(item['end']['y'], KLC_CRTYD_GRID)
 
+        if len(self.bad_grid) > 0:
+            module.graphicsChanged()
+
         # create courtyard if does not exists
         if len(self.fCourtyard) + len(self.bCourtyard) == 0:
             self.info("No courtyard detected - adding default courtyard")
@@ -21,8 +21,8 @@ class Rule(KLCRule):
         """
         module = self.module
         
-        self.pth_count = len(module.filterPads('thru_hole'))
-        self.smd_count = len(module.filterPads('smd'))
+        self.pth_count = len(self.context.filterPads('thru_hole'))
+        self.smd_count = len(self.context.filterPads('smd'))
 
         error = False
         
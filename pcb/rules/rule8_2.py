@@ -24,7 +24,7 @@ class Rule(KLCRule):
             # Ignore non-smd parts
             return False
 
-        center = module.padMiddlePosition()
+        center = self.context.padMiddlePosition()
         
         err = False
         
@@ -50,6 +50,6 @@ class Rule(KLCRule):
         if self.check():
             self.info("Footprint anchor fixed")
             
-            center = module.padMiddlePosition()
+            center = self.context.padMiddlePosition()
             
             module.setAnchor([center['x'], center['y']])
@@ -12,6 +12,31 @@ class Rule(KLCRule):
         self.sides = ["F.", "B."]
         self.required_layers = ["Cu","Paste","Mask"]
         
+    # Check the layers of a SMD pad, returns the missing and the extra layers
+    def checkLayers(self, layers):
+        missing = []
+
+        # Check that required layers are present
+        for layer in self.required_layers:
+            present = False
+            for side in self.sides:
+                lyr = side + layer
+                if lyr in layers:
+                    present = True
+
+            if not present:
+                missing.append(layer)
+
+        # Check for extra layers
+        allowed = []
+        for layer in self.required_layers:
+            for side in self.sides:
+                allowed.append(side + layer)
+
+        extra = [layer for layer in layers if layer not in allowed]
+
+        return missing, extra
+
     def checkPads(self, pads):
         
         self.wrong_layers = []
@@ -19,8 +44,6 @@ class Rule(KLCRule):
         errors = []
         
         for pad in pads:
-            layers = pad['layers']
-        
             # For SMD parts, following layers required:
             # F.Cu
             # F.Mask
@@ -29,36 +52,19 @@ class Rule(KLCRule):
             if not pad['type'] == 'smd':
                 continue
             
-            err = False
-            
-            # Check that required layers are present
-            for layer in self.required_layers:
-                present = False
-                for side in self.sides:
-                    lyr = side + layer
-                    if lyr in layers:
-                        present = True
-                        
-                if not present:
-                    errors.append("Pad '{n}' missing layer '{lyr}'".format(
-                        n=pad['number'],
-                        lyr=layer))
-                    err = True
-                        
-            # Check for extra layers
-            allowed = []
-            for layer in self.required_layers:
-                for side in self.sides:
-                    allowed.append(side + layer)
+            missing, extra = self.checkLayers(pad['layers'])
+
+            for layer in missing:
+                errors.append("Pad '{n}' missing layer '{lyr}'".format(
+                    n=pad['number'],
+                    lyr=layer))
                     
-            for layer in layers:
-                if layer not in allowed:
-                    errors.append("Pad '{n}' has extra layer '{lyr}'".format(
-                        n=pad['number'],
-                        lyr=layer))
-                    err = True
+            for layer in extra:
+                errors.append("Pad '{n}' has extra layer '{lyr}'".format(
+                    n=pad['number'],
+                    lyr=layer))
                     
-            if err:
+            if missing or extra:
                 self.wrong_layers.append(pad)
                 
         if len(errors) > 0:
@@ -68,6 +74,17 @@ class Rule(KLCRule):
                 
         return len(self.wrong_layers) > 0
         
+    # The SMD pads to check: with the pad table of the footprint, only the
+    # pads with wrong layers (each list of layers is checked once)
+    def padsToCheck(self):
+        module = self.module
+        table = module.padTable
+
+        if table is None:
+            return self.context.filterPads('smd')
+
+        return table.select(table.typeMask('smd') & table.layersMask(lambda layers: any(self.checkLayers(layers))))
+
     def check(self):
         """
         Proceeds the checking of the rule.
@@ -78,7 +95,7 @@ class Rule(KLCRule):
         module = self.module
         
         return any([
-            self.checkPads(module.filterPads("smd"))
+            self.checkPads(self.padsToCheck())
             ])
         
     def fix(self):
@@ -87,7 +104,7 @@ class Rule(KLCRule):
         """
         module = self.module
         
-        for pad in module.filterPads('smd'):
+        for pad in self.context.filterPads('smd'):
             self.info("Pad {n} - Setting required layers for SMD pad".format(n=pad['number']))
         
             # Guess pad layer (Front / Back)
@@ -95,4 +112,6 @@ class Rule(KLCRule):
             
             prefix = 'B.' if back else 'F.'
             
-            pad['layers'] = [prefix + layer for layer in self.required_layers]
\ No newline at end of file
+            pad['layers'] = [prefix + layer for layer in self.required_layers]
+
+        module.padsChanged()
\ No newline at end of file
@@ -22,9 +22,9 @@ class Rule(KLCRule):
         module = self.module
         # check if module is through-hole
         if module.attribute == 'pth':
-            pads = module.getPadsByNumber(1)
+            pads = self.context.getPadsByNumber(1)
             if len(pads) == 0:
-                pads = module.getPadsByNumber('A1')
+                pads = self.context.getPadsByNumber('A1')
                 
             if len(pads) == 0:
                 self.error("Pad 1 not found in footprint")
@@ -11,6 +11,13 @@ class Rule(KLCRule):
         
         self.required_layers = ["*.Cu","*.Mask"]
         
+    # Check the layers of a THT pad, returns the missing and the extra layers
+    def checkLayers(self, layers):
+        missing = [layer for layer in self.required_layers if layer not in layers]
+        extra = [layer for layer in layers if layer not in self.required_layers]
+
+        return missing, extra
+
     def checkPads(self, pads):
     
         self.wrong_layers = []
@@ -18,8 +25,6 @@ class Rule(KLCRule):
         errors = []
     
         for pad in pads:
-            layers = pad['layers']
-            
             # For THT parts, following layers required:
             # *.Cu
             # F.Mask
@@ -28,25 +33,21 @@ class Rule(KLCRule):
             if not pad['type'] == 'thru_hole':
                 continue
                 
-            err = False
-            
+            missing, extra = self.checkLayers(pad['layers'])
+
             # check required layers
-            for layer in self.required_layers:
-                if layer not in layers:
-                    errors.append("Pad '{n}' missing layer '{lyr}'".format(
-                        n=pad['number'],
-                        lyr=layer))
-                    err = True
+            for layer in missing:
+                errors.append("Pad '{n}' missing layer '{lyr}'".format(
+                    n=pad['number'],
+                    lyr=layer))
                         
             # check for extra layers
-            for layer in layers:
-                if layer not in self.required_layers:
-                    errors.append("Pad '{n}' has extra layer '{lyr}'".format(
-                        n=pad['number'],
-                        lyr=layer))
-                    err = True
+            for layer in extra:
+                errors.append("Pad '{n}' has extra layer '{lyr}'".format(
+                    n=pad['number'],
+                    lyr=layer))
                         
-            if err:
+            if missing or extra:
                 self.wrong_layers.append(pad)
                     
         if len(errors) > 0:
@@ -56,6 +57,17 @@ class Rule(KLCRule):
         
         return len(self.wrong_layers) > 0
         
+    # The THT pads to check: with the pad table of the footprint, only the
+    # pads with wrong layers (each list of layers is checked once)
+    def padsToCheck(self):
+        module = self.module
+        table = module.padTable
+
+        if table is None:
+            return self.context.filterPads('thru_hole')
+
+        return table.select(table.typeMask('thru_hole') & table.layersMask(lambda layers: any(self.checkLayers(layers))))
+
     def check(self):
         """
         Proceeds the checking of the rule.
@@ -66,7 +78,7 @@ class Rule(KLCRule):
         module = self.module
         
         return any([
-            self.checkPads(module.filterPads('thru_hole'))
+            self.checkPads(self.padsToCheck())
             ])
         
     def fix(self):
@@ -75,7 +87,9 @@ class Rule(KLCRule):
         """
         module = self.module
         
-        for pad in module.filterPads('thru_hole'):
+        for pad in self.context.filterPads('thru_hole'):
             self.info("Pad {n} - Setting required layers for THT pad".format(n=pad['number']))
             pad['layers'] = self.required_layers
+
+        module.padsChanged()
         
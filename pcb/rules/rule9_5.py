@@ -37,7 +37,7 @@ class Rule(KLCRule):
         """
         module = self.module
         
-        return any([self.checkPad(pad) for pad in module.filterPads('thru_hole')])
+        return any([self.checkPad(pad) for pad in self.context.filterPads('thru_hole')])
         
     def fix(self):
         """
@@ -3,6 +3,7 @@
 from __future__ import division
 
 from rules.rule import *
+from rules.klc_constants import *
 
 class Rule(KLCRule):
     """
@@ -27,7 +28,7 @@ class Rule(KLCRule):
 
         err = False
         
-        MIN_RING = 0.15
+        MIN_RING = KLC_MIN_ANNULAR_RING
         
         # Circular pad
         if drill_x == drill_y and pad_x == pad_y:
@@ -62,6 +63,21 @@ class Rule(KLCRule):
                 
         return err        
         
+    # The thru hole pads to check: with the pad table of the footprint, only
+    # the pads without drill size or with a ring below the minimum on an axis
+    def padsToCheck(self):
+        module = self.module
+        table = module.padTable
+
+        if table is None:
+            return self.context.filterPads('thru_hole')
+
+        a = table.array
+        small = (((a['size_x'] - a['drill_x']) / 2 < KLC_MIN_ANNULAR_RING) |
+                 ((a['size_y'] - a['drill_y']) / 2 < KLC_MIN_ANNULAR_RING))
+
+        return table.select(table.typeMask('thru_hole') & (small | table.noDrillMask()))
+
     def check(self):
         """
         Proceeds the checking of the rule.
@@ -71,7 +87,7 @@ class Rule(KLCRule):
         """
         module = self.module
         
-        return any([self.checkPad(pad) for pad in module.filterPads('thru_hole')])
+        return any([self.checkPad(pad) for pad in self.padsToCheck()])
         
     def fix(self):
         """
@@ -0,0 +1,65 @@
+#!/usr/bin/bash
+
+# This script file is used to test that the results cached by
+# check_kicad_mod.py (--cache) are dropped when a module used by the
+# checker changes: the minimum annular ring (rules/klc_constants.py) is
+# changed in a copy of the scripts, the cached run must then give the
+# same output as a run without cache.
+
+# example of use: ./test_check_cache.sh `find /usr/share/kicad/footprints -name *.kicad_mod`
+# (some of the footprints must have through hole pads)
+
+if [[ $# < 1 ]]; then
+    echo "Usage: $0 kicad_mod_files"
+    exit 1
+fi
+
+# colors
+RED="\e[0;31m"
+GREEN="\e[0;32m"
+NOCOLOR="\e[0m"
+
+here=`dirname "$0"`
+tmp=`mktemp -d`
+
+# copy of the scripts, so the constants can be changed
+cp -r "$here/../common" "$tmp/common"
+cp -r "$here" "$tmp/pcb"
+find "$tmp" -name '__pycache__' -o -name '*.pyc' | xargs rm -rf
+
+# check [name] [arguments], the output is stored in $tmp/name.out
+function check {
+    name="$1"
+    shift
+    python "$tmp/pcb/check_kicad_mod.py" -vv --nocolor "$@" > "$tmp/$name.out"
+}
+
+check cached --cache "$tmp/cache.db" "$@"
+check first --cache "$tmp/cache.db" "$@"
+
+sed -i 's/^KLC_MIN_ANNULAR_RING = .*/KLC_MIN_ANNULAR_RING = 10/' "$tmp/pcb/rules/klc_constants.py"
+
+check second --cache "$tmp/cache.db" "$@"
+check uncached "$@"
+
+error=0
+if [[ `diff "$tmp/cached.out" "$tmp/first.out"` ]]; then
+    echo -e "${RED}the cached results differ from the checked results${NOCOLOR}"
+    error=1
+fi
+if [[ ! `diff "$tmp/first.out" "$tmp/uncached.out"` ]]; then
+    echo -e "${RED}the annular ring change has no effect, no through hole pads?${NOCOLOR}"
+    error=1
+fi
+if [[ `diff "$tmp/second.out" "$tmp/uncached.out"` ]]; then
+    echo -e "${RED}the cached results were not dropped after the change of klc_constants.py${NOCOLOR}"
+    diff "$tmp/second.out" "$tmp/uncached.out"
+    error=1
+fi
+
+rm -rf "$tmp"
+
+if [[ $error == 0 ]]; then
+    echo -e "${GREEN}...OK${NOCOLOR}"
+fi
+exit $error
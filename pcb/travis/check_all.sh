@@ -1,9 +1,11 @@
 SCRIPT="/home/travis/build/kicad-library-utils/pcb/check_kicad_mod.py"
 
-error=0
-for change in $(git diff --name-only --diff-filter=AM $TRAVIS_COMMIT_RANGE); do
-    echo "Checking: $change"
-    python3 $SCRIPT "/$1/$change" -vv
-    error="$(($error+$?))"
-done
-exit $error
+# without a commit range (e.g. the first build of a branch) there is nothing to check
+if [ -z "$TRAVIS_COMMIT_RANGE" ]; then
+    exit 0
+fi
+
+# check all the footprints changed in the commit range, in a single process
+cd "/$1"
+python3 $SCRIPT --changed-since "$TRAVIS_COMMIT_RANGE" -vv
+exit $?
@@ -1,6 +1,13 @@
 # -*- coding: utf-8 -*-
 
-import sys, shlex
+import sys, os
+
+common = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+if not common in sys.path:
+    sys.path.append(common)
+
+from line_tokenizer import splitLine
 
 class Description(object):
     """
@@ -35,11 +42,7 @@ class Component(object):
                 continue
 
             line = line.replace('\n', '')
-            s = shlex.shlex(line)
-            s.whitespace_split = True
-            s.commenters = ''
-            s.quotes = '"'
-            line = list(s)
+            line = splitLine(line)
 
             # select the keys list and default values array
             if line[0] in self._KEYS:
@@ -89,11 +92,7 @@ class Sheet(object):
         self.fields = []
         for line in data:
             line = line.replace('\n', '')
-            s = shlex.shlex(line)
-            s.whitespace_split = True
-            s.commenters = ''
-            s.quotes = '"'
-            line = list(s)
+            line = splitLine(line)
             # select the keys list and default values array
             if line[0] in self._KEYS:
                 key_list = self._KEYS[line[0]]
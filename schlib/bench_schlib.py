@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+"""
+
+This file benchmarks the parsing of schematic library files (.lib).
+The new code paths are checked against the previous ones, which must produce
+identical results for every file.
+
+example of use: ./bench_schlib.py /usr/share/kicad/library/*.lib
+
+Without files, only the benchmarks on synthetic symbols are run.
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys, os
+import hashlib
+import shlex
+import shutil
+import tempfile
+import timeit
+
+common = os.path.abspath(os.path.join(sys.path[0], '..','common'))
+
+if not common in sys.path:
+    sys.path.append(common)
+
+from schlib import *
+import schlib
+from line_tokenizer import splitLine
+from print_color import *
+from rules import rule4_3
+
+# enable windows wildcards
+from glob import glob
+
+parser = argparse.ArgumentParser(description='Benchmark the parsing of schematic library files (.lib)')
+parser.add_argument('libfiles', nargs='*')
+parser.add_argument('-n', '--repeat', help='number of timing runs per benchmark (best run is reported)', type=int, default=3)
+parser.add_argument('--pins', help='number of pins of the synthetic symbol', type=int, default=1000)
+parser.add_argument('--nocolor', help='does not use colors to show the output', action='store_true')
+
+args = parser.parse_args()
+
+printer = PrintColor(use_color=not args.nocolor)
+
+libfiles = []
+
+for libfile in args.libfiles:
+    libfiles += glob(libfile)
+
+if args.libfiles and len(libfiles) == 0:
+    printer.red("File argument invalid: {f}".format(f=args.libfiles))
+    sys.exit(1)
+
+lines = []
+for libfile in libfiles:
+    with open(libfile) as f:
+        lines += [line.replace('\n', '') for line in f.readlines()]
+
+mismatch = 0
+
+def best(stmt):
+    return min(timeit.repeat(stmt, number=1, repeat=args.repeat))
+
+def report(name, old, new):
+    printer.regular("{n:>10}: {o:.3f}s -> {t:.3f}s ({s:.2f}x)".format(n=name, o=old, t=new, s=old / new))
+
+# the tokenizer which was used by schlib.Component
+def shlexSplit(line):
+    s = shlex.shlex(line)
+    s.whitespace_split = True
+    s.commenters = ''
+    s.quotes = '"'
+    return list(s)
+
+def tokenize(split):
+    result = []
+    for line in lines:
+        try:
+            result.append(split(line))
+        except ValueError as e:
+            result.append(str(e))
+    return result
+
+# the library checksum which was computed by schlib.SchLib (string concatenation)
+def concatChecksum(libfile):
+    with open(libfile) as f:
+        lines = f.readlines()
+    checksum_data = lines[0]
+    for line in lines[2:]:
+        checksum_data += line.strip()
+    return hashlib.md5(checksum_data.encode('utf-8')).hexdigest()
+
+# the same checksum, computed incrementally
+def incrementalChecksum(libfile):
+    with open(libfile) as f:
+        lines = f.readlines()
+    checksum = newChecksum()
+    update = checksum.update
+    update(lines[0].encode('utf-8'))
+    for line in lines[2:]:
+        update(line.strip().encode('utf-8'))
+    return checksum.hexdigest()
+
+# the lines of a library written by SchLib.save before (string concatenation)
+# (without the change of lib.header, which made a second save duplicate it)
+def concatSaveLines(lib):
+    to_write = list(lib.header)
+    for component in lib.components:
+        to_write += component.comments
+
+        line = 'DEF '
+        for key in Component._DEF_KEYS:
+            line += component.definition[key] + ' '
+        to_write.append(line.rstrip() + '\n')
+
+        for i, f in enumerate(component.fields):
+            line = "F{n} ".format(n=i)
+            keys_list = Component._F0_KEYS if i == 0 else Component._FN_KEYS
+            for k, key in enumerate(keys_list):
+                key_val = component.fields[i][key]
+                if k == 0 and not key_val.startswith('"'):
+                    key_val = '"' + key_val + '"'
+                line += key_val + ' '
+            to_write.append(line.rstrip() + '\n')
+
+        if len(component.aliases) > 0:
+            line = 'ALIAS '
+            for alias in component.aliases.keys():
+                line += alias + ' '
+            to_write.append(line.rstrip() + '\n')
+
+        if len(component.fplist) > 0:
+            to_write.append('$FPLIST\n')
+            for fp in component.fplist:
+                to_write.append(' ' + fp + '\n')
+            to_write.append('$ENDFPLIST\n')
+
+        to_write.append('DRAW\n')
+        for elem in component.drawOrdered:
+            item = elem[1]
+            line = elem[0] + ' '
+            for k in Component._DRAW_KEYS[elem[0]]:
+                if k == 'points':
+                    for i in item['points']:
+                        line += '{0} '.format(i)
+                else:
+                    line += item[k] + ' '
+            to_write.append(line.rstrip() + '\n')
+        to_write.append('ENDDRAW\n')
+        to_write.append('ENDDEF\n')
+
+    to_write.append('#\n')
+    to_write.append('#End Library\n')
+    return to_write
+
+def concatSave(lib, filename):
+    with open(filename, 'w') as f:
+        f.writelines(concatSaveLines(lib))
+
+def read(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+# the pin stacking search which was used by rule 4.3 (quadratic)
+def pinStacksQuadratic(component):
+    pin_locations = []
+    for pin in component.pins:
+        dupe = False
+        for loc in pin_locations:
+            if pin['posx'] == loc['x'] and pin['posy'] == loc['y'] and pin['unit'] == loc['u'] and pin['convert'] == loc['c']:
+                loc['pins'].append(pin)
+                dupe = True
+        if not dupe:
+            pin_locations.append({'x': pin['posx'], 'y': pin['posy'], 'u': pin['unit'], 'c': pin['convert'], 'pins': [pin]})
+    return pin_locations
+
+# write a library with a single symbol of n_pins pins, every 10th pin is
+# stacked on the previous one (every 20th pin is a duplicate)
+def syntheticLibrary(filename, n_pins):
+    lines = ['EESchema-LIBRARY Version 2.3', '#encoding utf-8']
+    lines.append('DEF SYNTHETIC U 0 40 Y Y 1 F N')
+    lines.append('F0 "U" 0 {y} 50 H V C CNN'.format(y=n_pins * 50 + 100))
+    lines.append('F1 "SYNTHETIC" 0 -{y} 50 H V C CNN'.format(y=n_pins * 50 + 100))
+    lines.append('DRAW')
+    lines.append('S -400 {y} 400 -{y} 0 1 10 f'.format(y=n_pins * 50))
+    for i in range(n_pins):
+        y = (i - i // 10) * 100
+        n = i if i % 20 == 10 else i + 1
+        lines.append('X P{n} {n} -500 {y} 100 R 50 50 1 1 {t}'.format(n=n, y=y, t='W' if i % 20 == 0 else 'I'))
+    lines += ['ENDDRAW', 'ENDDEF', '#', '#End Library']
+
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    with open(os.path.splitext(filename)[0] + '.dcm', 'w') as f:
+        f.write('EESchema-DOCLIB  Version 2.0\n#\n#End Doc Library\n')
+
+if libfiles:
+    printer.green("{n} files, {l} lines".format(n=len(libfiles), l=len(lines)))
+
+    # Tokenizer
+    if tokenize(shlexSplit) != tokenize(splitLine):
+        printer.red("Tokenizers disagree")
+        mismatch += 1
+
+    report('tokenizer', best(lambda: tokenize(shlexSplit)), best(lambda: tokenize(splitLine)))
+
+    # Checksums (the default md5 checksums must not change)
+    if any(SchLib(libfile).checksum != concatChecksum(libfile) for libfile in libfiles):
+        printer.red("Library checksums differ")
+        mismatch += 1
+
+    report('checksum', best(lambda: [concatChecksum(libfile) for libfile in libfiles]), best(lambda: [incrementalChecksum(libfile) for libfile in libfiles]))
+
+    schlib.checksum_algorithm = 'blake2b'
+    report('blake2b', best(lambda: [concatChecksum(libfile) for libfile in libfiles]), best(lambda: [incrementalChecksum(libfile) for libfile in libfiles]))
+    schlib.checksum_algorithm = 'md5'
+
+    # Total time to load the libraries (new code path only)
+    t = best(lambda: [SchLib(libfile) for libfile in libfiles])
+    printer.regular("{n:>10}: {t:.3f}s".format(n='load', t=t))
+
+    libs = [SchLib(libfile) for libfile in libfiles]
+    components = [component for lib in libs for component in lib.components]
+    pins = [pin for component in components for pin in component.pins]
+
+    # Memory used by the pin records, compared with the dictionaries used before
+    # (the field strings are shared by both and not counted)
+    old = sum(sys.getsizeof(dict(pin.items())) for pin in pins)
+    new = sum(sys.getsizeof(pin) for pin in pins)
+    printer.regular("{n:>10}: {o:.1f}kB -> {m:.1f}kB for {p} pins ({s:.2f}x)".format(n='pins', o=old / 1024.0, m=new / 1024.0, p=len(pins), s=float(old) / new))
+
+    # Round trip: load, save twice and load again
+    tmpdir = tempfile.mkdtemp()
+    try:
+        old_file = os.path.join(tmpdir, 'old.lib')
+        new_file = os.path.join(tmpdir, 'new.lib')
+
+        for lib in libs:
+            concatSave(lib, old_file)
+            lib.save(new_file)
+            first = (read(new_file), read(os.path.splitext(new_file)[0] + '.dcm'))
+            lib.save(new_file)
+            second = (read(new_file), read(os.path.splitext(new_file)[0] + '.dcm'))
+
+            if read(old_file) != first[0]:
+                printer.red("Saved library differs: {f}".format(f=lib.filename))
+                mismatch += 1
+
+            if first != second:
+                printer.red("Second save differs: {f}".format(f=lib.filename))
+                mismatch += 1
+
+            if [c.checksum for c in SchLib(new_file).components] != [c.checksum for c in lib.components]:
+                printer.red("Saved components differ: {f}".format(f=lib.filename))
+                mismatch += 1
+
+        report('save', best(lambda: [concatSave(lib, old_file) for lib in libs]), best(lambda: [lib.save(new_file) for lib in libs]))
+    finally:
+        shutil.rmtree(tmpdir)
+
+# Synthetic symbol
+tmpdir = tempfile.mkdtemp()
+try:
+    syntheticLibrary(os.path.join(tmpdir, 'synthetic.lib'), args.pins)
+    component = SchLib(os.path.join(tmpdir, 'synthetic.lib')).components[0]
+finally:
+    shutil.rmtree(tmpdir)
+
+printer.green("synthetic symbol, {n} pins".format(n=len(component.pins)))
+
+# Rule 4.3, pin stacking: quadratic search only -> complete rule check
+rule = rule4_3.Rule(component)
+rule.check()
+if len(rule.duplicated_pins) != (args.pins + 9) // 20:
+    printer.red("Rule 4.3 found {n} duplicated pins".format(n=len(rule.duplicated_pins)))
+    mismatch += 1
+stacks = [[id(pin) for pin in loc['pins']] for loc in pinStacksQuadratic(component) if len(loc['pins']) > 1]
+if not all([[id(pin) for pin in group] in stacks for group in rule.duplicated_pins]):
+    printer.red("Rule 4.3 stacks disagree")
+    mismatch += 1
+
+report('rule 4.3', best(lambda: pinStacksQuadratic(component)), best(lambda: rule4_3.Rule(component).check()))
+
+sys.exit(mismatch)
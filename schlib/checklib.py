@@ -3,24 +3,30 @@
 
 import argparse
 import sys, os
+import io
+import multiprocessing
+import shutil
+import tempfile
 
 common = os.path.abspath(os.path.join(sys.path[0], '..','common'))
 
 if not common in sys.path:
     sys.path.append(common)
-    
+
 from schlib import *
 
 from print_color import *
 import re
 from rules import *
 from rules.rule import KLCRule
+from check_cache import *
+from git_changes import *
 
 #enable windows wildcards
 from glob import glob
 
 parser = argparse.ArgumentParser(description='Checks KiCad library files (.lib) against KiCad Library Convention (KLC v2.0) rules. You can find the KLC at https://github.com/KiCad/kicad-library/wiki/Kicad-Library-Convention')
-parser.add_argument('libfiles', nargs='+')
+parser.add_argument('libfiles', nargs='*')
 parser.add_argument('-c', '--component', help='check only a specific component (implicitly verbose)', action='store')
 parser.add_argument('-p', '--pattern', help='Check multiple components by matching a regular expression', action='store')
 parser.add_argument('-r','--rule',help='Select a particular rule (or rules) to check against (default = all rules). Use comma separated values to select multiple rules. e.g. "-r 3.1,EC02"')
@@ -28,58 +34,187 @@ parser.add_argument('--fix', help='fix the violations if possible', action='stor
 parser.add_argument('--nocolor', help='does not use colors to show the output', action='store_true')
 parser.add_argument('-v', '--verbose', help='Enable verbose output. -v shows brief information, -vv shows complete information', action='count')
 parser.add_argument('-s', '--silent', help='skip output for symbols passing all checks', action='store_true')
+parser.add_argument('-j', '--jobs', help='check the libraries using N worker processes (output is printed in input order)', type=int, default=1)
+parser.add_argument('--cache', help='store the results in a SQLite database FILE, symbols which did not change since the last run replay their cached results (ignored with --fix)', action='store', metavar='FILE')
+parser.add_argument('--changed-since', help='check only the symbols added or modified since the git revision REV (or range of revisions, e.g. "master...HEAD"). If no libfiles are given, all the changed libraries of the repository are checked', action='store', metavar='REV')
 
-args = parser.parse_args()
+# get all rules
+def getRules(selected_rules):
+    all_rules = []
+    for f in sorted(globals().keys()):
+        if f.startswith('rule'):
+            #f is of the format rule3_1 (user may have speicified a rule like 3.1)
+            if (selected_rules == None) or (f[4:].replace("_",".") in selected_rules):
+                all_rules.append(globals()[f].Rule)
 
-printer = PrintColor(use_color = not args.nocolor)
+    # add all extra checking
+    for f in sorted(globals().keys()):
+        if f.startswith('EC'):
+            if (selected_rules is None) or (f.lower() in [r.lower() for r in selected_rules]):
+                all_rules.append(globals()[f].Rule)
+    return all_rules
 
-# set verbosity globally
-KLCRule.verbosity = args.verbose
+# set the options used by checkLibrary (called in each worker process)
+def setup(options):
+    global args, printer, all_rules, cache
 
-#user can select various rules
-#in the format -r=3.1 or --rule=3.1,EC01,EC05
-if args.rule:
-    selected_rules = args.rule.split(',')
-else:
-    #ALL rules are used
-    selected_rules = None
+    args = options
 
-# get all rules
-all_rules = []
-for f in dir():
-    if f.startswith('rule'):
-        #f is of the format rule3_1 (user may have speicified a rule like 3.1)
-        if (selected_rules == None) or (f[4:].replace("_",".") in selected_rules):
-            all_rules.append(globals()[f].Rule)
-
-# add all extra checking
-for f in dir():
-    if f.startswith('EC'):
-        if (selected_rules is None) or (f.lower() in [r.lower() for r in selected_rules]):
-            all_rules.append(globals()[f].Rule)
-
-#grab list of libfiles (even on windows!)
-libfiles = []
-
-for libfile in args.libfiles:
-    libfiles += glob(libfile)
-
-if len(libfiles) == 0:
-    printer.red("File argument invalid: {f}".format(f=args.libfiles))
-    sys.exit(1)
-    
-exit_code = 0
-
-for libfile in libfiles:
-    lib = SchLib(libfile)
+    printer = PrintColor(use_color = not args.nocolor)
+
+    # set verbosity globally
+    KLCRule.verbosity = args.verbose
+
+    #user can select various rules
+    #in the format -r=3.1 or --rule=3.1,EC01,EC05
+    if args.rule:
+        selected_rules = args.rule.split(',')
+    else:
+        #ALL rules are used
+        selected_rules = None
+
+    all_rules = getRules(selected_rules)
+
+    # the fixes can not be replayed
+    if args.cache and not args.fix:
+        cache = CheckCache(args.cache, all_rules)
+    else:
+        cache = None
+
+# the cache key of a component, its content and its documentation
+def componentHash(component):
+    docs = [component.documentation] + list(component.aliases.items())
+    return contentHash([component.checksum, repr(docs)])
+
+# check a single component, printing the results
+# returns the value to add to the exit code
+def checkComponent(component):
+
+    # check the rules
+    n_violations = 0
+
+    first = True
+
+    if cache:
+        key = componentHash(component)
+        result = cache.get(key)
+    else:
+        result = None
+
+    if result is None:
+        rules = (rule(component) for rule in all_rules)
+    else:
+        rules = [CachedRule(record) for record in result['rules']]
+
+    records = []
+
+    for rule in rules:
+        error = rule.check()
+
+        if error or rule.hasOutput():
+            records.append(CheckCache.record(rule, error))
+
+        if rule.hasOutput():
+            if first:
+                printer.green("Checking symbol '{sym}':".format(sym=component.name))
+                first = False
+
+            printer.yellow("Violating " + rule.name, indentation=2)
+            rule.processOutput(printer, args.verbose, args.silent)
+
+        # Specifically check for errors
+        if error:
+            n_violations += 1
+
+            if args.fix:
+                rule.fix()
+                rule.processOutput(printer, args.verbose, args.silent)
+
+    # No messages?
+    if first:
+        if not args.silent:
+            printer.green("Checking symbol '{sym}' - No errors".format(sym=component.name))
+
+    if cache and result is None:
+        cache.put(key, {'name': component.name, 'rules': records})
+
+    # check the number of violations
+    return 1 if n_violations > 0 else 0
+
+# the last library loaded by a worker, reused when a library is split
+# into several chunks
+_library = None
+
+def loadLibrary(libfile):
+    global _library
+    if _library is None or _library.filename != libfile:
+        _library = SchLib(libfile)
+    return _library
+
+# find the symbols of libfile which were added or modified since rev
+# returns None if the library did not exist at rev
+def changedSymbols(libfile, rev):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        old_libfile = os.path.join(tmpdir, os.path.basename(libfile))
+
+        if not showFile(rev, libfile, old_libfile):
+            return None
+
+        showFile(rev, os.path.splitext(libfile)[0] + '.dcm', os.path.splitext(old_libfile)[0] + '.dcm')
+
+        old_hash = {}
+        for component in SchLib(old_libfile).components:
+            old_hash[component.name] = componentHash(component)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return set(c.name for c in loadLibrary(libfile).components if old_hash.get(c.name) != componentHash(c))
+
+# find the libraries (.lib or .dcm) changed since rev, restricted to libfiles if any
+# returns the list of libraries and a dictionary of the changed symbols of each library
+def changedLibraries(rev, libfiles):
+    # a library also changes with its documentation
+    files = libfiles + [os.path.splitext(f)[0] + '.dcm' for f in libfiles]
+
+    changed = []
+    for filename in changedFiles(rev, ['.lib', '.dcm'], files):
+        libfile = os.path.splitext(filename)[0] + '.lib'
+        if os.path.isfile(libfile) and not libfile in changed:
+            changed.append(libfile)
+
+    if libfiles:
+        # keep the order of the arguments
+        changed = [f for f in libfiles if f in changed]
+
+    old_rev = oldRevision(rev, repositoryDir(libfiles))
+
+    libraries = []
+    symbols = {}
+
+    for libfile in changed:
+        names = changedSymbols(libfile, old_rev)
+        if names is None or len(names) > 0:
+            libraries.append(libfile)
+            symbols[libfile] = names
+
+    return libraries, symbols
+
+# check one chunk (out of n_chunks) of the components of a library
+# if names is given, only the components in names are checked
+# the library is saved (--fix) only when it is checked in a single chunk
+# returns the value to add to the exit code
+def checkLibrary(libfile, chunk=0, n_chunks=1, names=None):
+    lib = loadLibrary(libfile)
     n_components = 0
 
-    # Print library name
-    if len(libfiles) > 1:
-        printer.purple('Library: %s' % libfile)
+    n = len(lib.components)
+    components = lib.components[n * chunk // n_chunks:n * (chunk + 1) // n_chunks]
+
+    errors = 0
+
+    for component in components:
 
-    for component in lib.components:
-        
         #simple match
         match = True
         if args.component:
@@ -89,46 +224,104 @@ for libfile in libfiles:
         if args.pattern:
             match = match and re.search(args.pattern, component.name, flags=re.IGNORECASE)
 
+        if names is not None:
+            match = match and component.name in names
+
         if not match: continue
 
         n_components += 1
 
-        # check the rules
-        n_violations = 0
-
-        first = True
-    
-        for rule in all_rules:
-            rule = rule(component)
-            
-            error = rule.check()
-            
-            if rule.hasOutput():
-                if first:
-                    printer.green("Checking symbol '{sym}':".format(sym=component.name))
-                    first = False
-                    
-                printer.yellow("Violating " + rule.name, indentation=2)
-                rule.processOutput(printer, args.verbose, args.silent)
-            
-            # Specifically check for errors
-            if error:
-                n_violations += 1
-
-                if args.fix:
-                    rule.fix()
-                    rule.processOutput(printer, args.verbose, args.silent)
-            
-        # No messages?
-        if first:
-            if not args.silent:
-                printer.green("Checking symbol '{sym}' - No errors".format(sym=component.name))
-            
-        # check the number of violations
-        if n_violations > 0:
-            exit_code += 1
+        errors += checkComponent(component)
 
-    if args.fix:
+    if args.fix and n_chunks == 1:
         lib.save()
-		
-sys.exit(exit_code);
+
+    if cache:
+        cache.commit()
+
+    return errors
+
+# call function(*arguments), capturing the printed output
+# returns the output and the value returned by the function
+def captureOutput(function, *arguments):
+    stdout = sys.stdout
+    sys.stdout = io.StringIO() if sys.version_info[0] >= 3 else io.BytesIO()
+    try:
+        result = function(*arguments)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+    return output, result
+
+# check a chunk of a library in a worker process
+# the printed output is captured and sent back with the exit code increment
+def checkLibraryCaptured(task):
+    output, errors = captureOutput(checkLibrary, *task)
+
+    return {'task': task, 'output': output, 'errors': errors}
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    setup(args)
+
+    #grab list of libfiles (even on windows!)
+    libfiles = []
+
+    for libfile in args.libfiles:
+        libfiles += glob(libfile)
+
+    # the symbols to check in each library (None = all the symbols)
+    symbols = {}
+
+    if args.changed_since:
+        try:
+            libfiles, symbols = changedLibraries(args.changed_since, libfiles)
+        except RuntimeError as e:
+            printer.red(str(e))
+            sys.exit(1)
+
+        if len(libfiles) == 0:
+            if not args.silent:
+                printer.green("No library changed since {rev}".format(rev=args.changed_since))
+            sys.exit(0)
+
+    elif len(libfiles) == 0:
+        printer.red("File argument invalid: {f}".format(f=args.libfiles))
+        sys.exit(1)
+
+    exit_code = 0
+
+    if args.jobs > 1:
+        # split the libraries in chunks of components if there are fewer
+        # libraries than jobs. With --fix every library is handled by a
+        # single worker, so it is saved once after all symbols are processed
+        n_chunks = 1
+        if not args.fix and len(libfiles) < args.jobs:
+            n_chunks = -(-args.jobs // len(libfiles))
+
+        tasks = [(libfile, chunk, n_chunks, symbols.get(libfile)) for libfile in libfiles for chunk in range(n_chunks)]
+
+        pool = multiprocessing.Pool(args.jobs, setup, (args,))
+        # imap returns the results in input order
+        for result in pool.imap(checkLibraryCaptured, tasks):
+            libfile, chunk, n_chunks, names = result['task']
+
+            # Print library name
+            if len(libfiles) > 1 and chunk == 0:
+                printer.purple('Library: %s' % libfile)
+
+            sys.stdout.write(result['output'])
+            exit_code += result['errors']
+        pool.close()
+        pool.join()
+    else:
+        for libfile in libfiles:
+            # Print library name
+            if len(libfiles) > 1:
+                printer.purple('Library: %s' % libfile)
+
+            exit_code += checkLibrary(libfile, names=symbols.get(libfile))
+
+    sys.exit(exit_code);
@@ -8,11 +8,19 @@ from __future__ import print_function
 This file compares two .lib files and generates a list of deleted / added / updated components.
 This is to be used to compare an updated library file with a previous version to determine which components have been changed.
 
+If --new and --old are directories, all the libraries of the two trees are compared
+(paired by their path relative to the directories). Libraries whose .lib and .dcm files
+are byte-identical are skipped without being parsed, and the components which moved
+from a library to another (unchanged) are reported as moved.
+
 """
 
 import argparse
 import sys
 import os
+import json
+from collections import OrderedDict
+import multiprocessing
 
 # Path to common directory
 common = os.path.abspath(os.path.join(sys.path[0], '..','common'))
@@ -21,7 +29,11 @@ if not common in sys.path:
     sys.path.append(common)
 
 from schlib import *
+import schlib
 from print_color import *
+from check_cache import contentHash
+import checklib
+from symbol_diff import diffComponents, diffLines
 
 def ExitError( msg ):
     print(msg)
@@ -29,108 +41,400 @@ def ExitError( msg ):
 
 parser = argparse.ArgumentParser(description="Compare two .lib files to determine which symbols have changed")
 
-parser.add_argument("--new", help="New (updated) .lib file")
-parser.add_argument("--old", help="Old (original) .lib file for comparison")
+parser.add_argument("--new", help="New (updated) .lib file, or directory of .lib files")
+parser.add_argument("--old", help="Old (original) .lib file, or directory of .lib files, for comparison")
 parser.add_argument("-v", "--verbose", help="Enable extra verbose output", action="store_true")
 parser.add_argument("--check", help="Perform KLC check on updated/added components", action='store_true')
+parser.add_argument("--diff", help="Show what changed in each updated component", action='store_true')
+parser.add_argument("--json", help="Write the list of changes, with the detailed differences of the updated components, to a JSON file ('-' for the standard output, instead of the lists, the KLC check output then goes to the standard error)", metavar="FILE")
+parser.add_argument("--checksum", help="Algorithm of the checksums used to compare the components (default md5, blake2b is faster)", choices=['md5', 'blake2b'], default='md5')
+parser.add_argument("-j", "--jobs", help="Compare the libraries (directory mode) and perform the KLC check using N worker processes", type=int, default=1)
 parser.add_argument("--nocolor", help="Does not use colors to show the output", action='store_true')
 
-args = parser.parse_args()
-
-if not args.new:
-    ExitError("New file not supplied")
-
-if not args.old:
-    ExitError("Original file not supplied")
-
-def KLCCheck(component):
-    # Wrap library in "quotes" if required
-    lib = args.new
-    if " " in lib and '"' not in lib:
-        lib = '"' + lib + '"'
-
-    call = 'python checklib.py {lib} -c={cmp} -vv -s {nocolor}'.format(
-                lib = lib,
-                cmp = component,
-                nocolor = "--nocolor" if args.nocolor else ""
-                )
-
-    return os.system(call)
-
-printer = PrintColor(use_color = not args.nocolor)
-
-new_lib = SchLib( args.new )
-old_lib = SchLib( args.old )
-
-# If the libs themselves are unchanged, ignore!
-if new_lib.compareChecksum(old_lib):
-    # exit silently
-    sys.exit(0)
-
-# Dicts of name:checksum pairs
-new_chk = {}
-old_chk = {}
-
-deleted = []
-added = []
-updated = []
-
-errors = 0
-
-for cmp in new_lib.components:
-    new_chk[cmp.name] = cmp.checksum
-
-for cmp in old_lib.components:
-    old_chk[cmp.name] = cmp.checksum
-
-for name in old_chk.keys():
-    # First, check if any components have been deleted
-    if not name in new_chk:
-        deleted.append(name)
-        continue
-
-    # Next, check for checksum mismatch
-    if not old_chk[name] == new_chk[name]:
-        updated.append(name)
-
-# Finally, check for NEW components
-for name in new_chk.keys():
-    if not name in old_chk:
-        added.append(name)
-
-# Display any deleted components
-if len(deleted) > 0:
-    if args.verbose:
-        printer.light_red("Components Removed: {n}".format(n=len(deleted)))
-    for cmp in deleted:
-        printer.light_red("- " + cmp)
-
-# Display any added components
-if len(added) > 0:
-    if args.verbose:
-        printer.light_green("Components Added: {n}".format(n=len(added)))
-    for cmp in added:
-        printer.light_green("+ " + cmp)
-
-        # Perform KLC check on component
-        if args.check:
-            if KLCCheck(cmp) is not 0:
-                errors += 1
-
-# Display any updated components
-if len(updated) > 0:
-    if args.verbose:
-        printer.yellow("Components Updated: {n}".format(n=len(updated)))
-    for cmp in updated:
-        printer.yellow("# " + cmp)
-
-        # perform KLC check on component
-        if args.check:
-            if KLCCheck(cmp) is not 0:
-                errors += 1
-
-if args.verbose and len(deleted) == 0 and len(added) == 0 and len(updated) == 0:
-    printer.green("No component variations found")
-
-# Return the number of errors found ( zero if --check is not set )
-sys.exit(errors)
+# The components of the new library, by name (used by the KLC check)
+new_components = None
+
+# Set the KLC check options (called in each worker process)
+def setupCheck(options):
+    global new_components
+
+    checklib.setup(options)
+
+    # Processes which are not forked must load the library again
+    if new_components is None:
+        new_components = dict((cmp.name, cmp) for cmp in SchLib(options.libfiles[0]).components)
+
+# Perform KLC check on a component of the new library
+# returns the printed output and the value to add to the number of errors
+def KLCCheck(name):
+    return checklib.captureOutput(checklib.checkComponent, new_components[name])
+
+# Compare the components of two libraries (either can be None, i.e. missing)
+# returns the lists of deleted, added and updated components
+def compareLibraries(new_lib, old_lib):
+    # Dicts of name:checksum pairs
+    new_chk = {}
+    old_chk = {}
+
+    deleted = []
+    added = []
+    updated = []
+
+    for cmp in (new_lib.components if new_lib else []):
+        new_chk[cmp.name] = cmp.checksum
+
+    for cmp in (old_lib.components if old_lib else []):
+        old_chk[cmp.name] = cmp.checksum
+
+    for name in old_chk.keys():
+        # First, check if any components have been deleted
+        if not name in new_chk:
+            deleted.append(name)
+            continue
+
+        # Next, check for checksum mismatch
+        if not old_chk[name] == new_chk[name]:
+            updated.append(name)
+
+    # Finally, check for NEW components
+    for name in new_chk.keys():
+        if not name in old_chk:
+            added.append(name)
+
+    return deleted, added, updated
+
+# Detailed differences of the updated components
+def diffLibraries(new_lib, old_lib, updated):
+    new_by_name = dict((cmp.name, cmp) for cmp in new_lib.components)
+    old_by_name = dict((cmp.name, cmp) for cmp in old_lib.components)
+
+    diffs = {}
+    for name in updated:
+        diffs[name] = diffComponents(old_by_name[name], new_by_name[name])
+
+    return diffs
+
+# The .lib files of a directory tree, relative to the directory
+def libraryFiles(directory):
+    libfiles = []
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.lib'):
+                libfiles.append(os.path.relpath(os.path.join(root, name), directory))
+    return libfiles
+
+# Hash of the raw content of a library and of its documentation
+def libraryHash(libfile):
+    data = []
+    for filename in [libfile, os.path.splitext(libfile)[0] + '.dcm']:
+        if os.path.isfile(filename):
+            with open(filename, 'rb') as f:
+                data.append(f.read())
+        else:
+            # a missing file differs from an empty one
+            data.append('missing')
+    return contentHash(data)
+
+# The options of the directory comparison (set in each worker process)
+compare_args = None
+
+def setupCompare(options):
+    global compare_args
+    compare_args = options
+    schlib.checksum_algorithm = options.checksum
+
+# Compare a library of the new tree with the library of the same name in the old tree
+# returns the deleted and added components, with their checksums, and the updated ones
+def compareLibraryPair(libfile):
+    new_file = os.path.join(compare_args.new, libfile)
+    old_file = os.path.join(compare_args.old, libfile)
+
+    new_lib = SchLib(new_file) if os.path.isfile(new_file) else None
+    old_lib = SchLib(old_file) if os.path.isfile(old_file) else None
+
+    deleted, added, updated = compareLibraries(new_lib, old_lib)
+
+    new_chk = dict((cmp.name, cmp.checksum) for cmp in (new_lib.components if new_lib else []))
+    old_chk = dict((cmp.name, cmp.checksum) for cmp in (old_lib.components if old_lib else []))
+
+    result = {
+        'library': libfile,
+        'deleted': [(name, old_chk[name]) for name in deleted],
+        'added': [(name, new_chk[name]) for name in added],
+        'updated': updated,
+        'diffs': {},
+        }
+
+    # (a library which is new or deleted has no updated components)
+    if updated and (compare_args.diff or compare_args.json):
+        result['diffs'] = diffLibraries(new_lib, old_lib, updated)
+
+    return result
+
+# Compare two directories of libraries
+# returns the results of compareLibraryPair for the changed libraries (sorted by
+# library) and the list of moved components, as (name, old library, new library)
+def compareDirectories(args):
+    libfiles = sorted(set(libraryFiles(args.new) + libraryFiles(args.old)))
+
+    # Skip the libraries which did not change at all, without parsing them
+    changed = [libfile for libfile in libfiles if libraryHash(os.path.join(args.new, libfile)) != libraryHash(os.path.join(args.old, libfile))]
+
+    if args.jobs > 1 and len(changed) > 1:
+        pool = multiprocessing.Pool(args.jobs, setupCompare, (args,))
+        # imap returns the results in input order
+        results = list(pool.imap(compareLibraryPair, changed))
+        pool.close()
+        pool.join()
+    else:
+        setupCompare(args)
+        results = [compareLibraryPair(libfile) for libfile in changed]
+
+    # A component deleted from a library and added, unchanged, to another one was moved
+    deleted = {}
+    for result in results:
+        for name, checksum in result['deleted']:
+            deleted.setdefault(checksum, []).append((name, result['library']))
+
+    moved = []
+    for result in results:
+        added = []
+        for name, checksum in result['added']:
+            if deleted.get(checksum):
+                old_name, old_libfile = deleted[checksum].pop(0)
+                moved.append((name, old_libfile, result['library']))
+            else:
+                added.append((name, checksum))
+        result['added'] = added
+
+    moved_from = set((name, old_libfile) for name, old_libfile, new_libfile in moved)
+    for result in results:
+        result['deleted'] = [(name, checksum) for name, checksum in result['deleted'] if not (name, result['library']) in moved_from]
+
+    return results, moved
+
+# Print the changes of a library
+def printChanges(printer, args, deleted, added, updated, diffs):
+    # Display any deleted components
+    if len(deleted) > 0:
+        if args.verbose:
+            printer.light_red("Components Removed: {n}".format(n=len(deleted)))
+        for cmp in deleted:
+            printer.light_red("- " + cmp)
+
+    # Display any added components
+    if len(added) > 0:
+        if args.verbose:
+            printer.light_green("Components Added: {n}".format(n=len(added)))
+        for cmp in added:
+            printer.light_green("+ " + cmp)
+
+    # Display any updated components
+    if len(updated) > 0:
+        if args.verbose:
+            printer.yellow("Components Updated: {n}".format(n=len(updated)))
+        for cmp in updated:
+            printer.yellow("# " + cmp)
+
+            if args.diff:
+                for line in diffLines(diffs[cmp]):
+                    printer.regular(line, indentation=4)
+
+# Write the JSON report
+def writeJSON(filename, report):
+    if filename == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+
+# With '--json -' the standard output holds the JSON report, the KLC check
+# output (printed after the report) goes to the standard error instead
+def checkOutputToStderr(args):
+    if args.json == '-':
+        sys.stdout.flush()
+        sys.stdout = sys.stderr
+
+# KLC check of the given components of each library of the new tree (same options
+# as 'checklib.py -vv -s'), libraries is a list of (library, names)
+# returns the number of components with violations
+def checkDirectory(args, libraries):
+    options = checklib.parser.parse_args(['-vv', '-s'] + (['--nocolor'] if args.nocolor else []))
+
+    tasks = [(os.path.join(args.new, libfile), 0, 1, set(names)) for libfile, names in libraries]
+
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs, checklib.setup, (options,))
+        # imap returns the results in input order
+        results = pool.imap(checklib.checkLibraryCaptured, tasks)
+    else:
+        checklib.setup(options)
+        results = (checklib.checkLibraryCaptured(task) for task in tasks)
+
+    errors = 0
+    for result in results:
+        sys.stdout.write(result['output'])
+        errors += result['errors']
+
+    if args.jobs > 1:
+        pool.close()
+        pool.join()
+
+    return errors
+
+# Compare two directories of libraries, print the changes and the result of the
+# KLC check (--check)
+# returns the number of errors found
+def mainDirectories(args, printer):
+    results, moved = compareDirectories(args)
+
+    errors = 0
+
+    n_changes = 0
+
+    # The JSON report replaces the lists on the standard output
+    for result in (results if args.json != '-' else []):
+        deleted = [name for name, checksum in result['deleted']]
+        added = [name for name, checksum in result['added']]
+        updated = result['updated']
+
+        if len(deleted + added + updated) == 0:
+            continue
+
+        n_changes += len(deleted + added + updated)
+
+        printer.purple("Library: {lib}".format(lib=result['library']))
+        printChanges(printer, args, deleted, added, updated, result['diffs'])
+
+    # Display any moved components
+    if len(moved) > 0 and args.json != '-':
+        if args.verbose:
+            printer.light_blue("Components Moved: {n}".format(n=len(moved)))
+        for name, old_libfile, new_libfile in moved:
+            printer.light_blue("> {name}: {old} -> {new}".format(name=name, old=old_libfile, new=new_libfile))
+
+    if args.verbose and n_changes == 0 and len(moved) == 0 and args.json != '-':
+        printer.green("No component variations found")
+
+    if args.json:
+        report = OrderedDict([
+            ('new', args.new),
+            ('old', args.old),
+            ('libraries', [OrderedDict([
+                ('library', result['library']),
+                ('removed', [name for name, checksum in result['deleted']]),
+                ('added', [name for name, checksum in result['added']]),
+                ('updated', [result['diffs'][name] for name in result['updated']]),
+                ]) for result in results]),
+            ('moved', [OrderedDict([('name', name), ('old', old_libfile), ('new', new_libfile)]) for name, old_libfile, new_libfile in moved]),
+            ])
+
+        writeJSON(args.json, report)
+
+    # Perform KLC check on added and updated components
+    if args.check:
+        libraries = [(result['library'], [name for name, checksum in result['added']] + result['updated']) for result in results]
+        libraries = [(libfile, names) for libfile, names in libraries if names]
+
+        n = sum(len(names) for libfile, names in libraries)
+
+        if n > 0:
+            checkOutputToStderr(args)
+
+            errors = checkDirectory(args, libraries)
+
+            if errors > 0:
+                printer.light_red("KLC check: {e} of {n} components have violations".format(e=errors, n=n))
+            elif args.verbose:
+                printer.green("KLC check: {n} components checked, no violations".format(n=n))
+
+    return errors
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    if not args.new:
+        ExitError("New file not supplied")
+
+    if not args.old:
+        ExitError("Original file not supplied")
+
+    printer = PrintColor(use_color = not args.nocolor)
+
+    schlib.checksum_algorithm = args.checksum
+
+    if os.path.isdir(args.new) or os.path.isdir(args.old):
+        if not (os.path.isdir(args.new) and os.path.isdir(args.old)):
+            ExitError("New and original must both be files or both be directories")
+
+        sys.exit(mainDirectories(args, printer))
+
+    new_lib = SchLib( args.new )
+    old_lib = SchLib( args.old )
+
+    # If the libs themselves are unchanged, ignore!
+    if new_lib.compareChecksum(old_lib):
+        # exit silently
+        sys.exit(0)
+
+    errors = 0
+
+    deleted, added, updated = compareLibraries(new_lib, old_lib)
+
+    # Detailed differences of the updated components
+    diffs = {}
+
+    if args.diff or args.json:
+        diffs = diffLibraries(new_lib, old_lib, updated)
+
+    # The JSON report replaces the lists on the standard output
+    if args.json != '-':
+        printChanges(printer, args, deleted, added, updated, diffs)
+
+        if args.verbose and len(deleted) == 0 and len(added) == 0 and len(updated) == 0:
+            printer.green("No component variations found")
+
+    if args.json:
+        report = OrderedDict([
+            ('new', args.new),
+            ('old', args.old),
+            ('removed', deleted),
+            ('added', added),
+            ('updated', [diffs[name] for name in updated]),
+            ])
+
+        writeJSON(args.json, report)
+
+    # Perform KLC check on added and updated components, in the loaded library
+    # (same options as 'checklib.py -vv -s')
+    if args.check and len(added + updated) > 0:
+        checkOutputToStderr(args)
+
+        options = checklib.parser.parse_args([args.new, '-vv', '-s'] + (['--nocolor'] if args.nocolor else []))
+
+        new_components = dict((cmp.name, cmp) for cmp in new_lib.components)
+
+        if args.jobs > 1:
+            pool = multiprocessing.Pool(args.jobs, setupCheck, (options,))
+            # imap returns the results in input order
+            results = pool.imap(KLCCheck, added + updated)
+        else:
+            setupCheck(options)
+            results = (KLCCheck(name) for name in added + updated)
+
+        for output, result in results:
+            sys.stdout.write(output)
+            errors += result
+
+        if args.jobs > 1:
+            pool.close()
+            pool.join()
+
+        if errors > 0:
+            printer.light_red("KLC check: {e} of {n} components have violations".format(e=errors, n=len(added + updated)))
+        elif args.verbose:
+            printer.green("KLC check: {n} components checked, no violations".format(n=len(added + updated)))
+
+    # Return the number of errors found ( zero if --check is not set )
+    sys.exit(errors)
@@ -5,12 +5,14 @@ from __future__ import print_function
 
 """
 
-This file looks for components that are duplicated within a library
+This file looks for components that are duplicated within a library,
+or across a set of libraries (--cross-library)
 
 """
 
 import argparse
 import sys
+from collections import OrderedDict
 from schlib import *
 from print_color import *
 import os
@@ -22,11 +24,12 @@ def ExitError( msg ):
     print(msg)
     sys.exit(-1)
 
-parser = argparse.ArgumentParser(description="Find duplicate parts (including aliases) in a .lib file")
+parser = argparse.ArgumentParser(description="Find duplicate parts (including aliases) in .lib files")
 
 parser.add_argument('libfiles', help=".lib file(s)",nargs="+")
 parser.add_argument('-s', '--silent', help='only show errors', action='store_true')
 parser.add_argument('--nocolor', help='does not use color', action='store_true')
+parser.add_argument('--cross-library', help='also find names (or aliases) defined in more than one library', action='store_true')
 
 args = parser.parse_args()
 
@@ -39,7 +42,11 @@ for lib in args.libfiles:
     libfiles += glob(lib)
 
 errors = 0
-            
+
+# global index of { name or alias : [(libfile, component name)] }
+# built in a single pass over all the libraries
+index = OrderedDict()
+
 for libfile in libfiles:
     lib = SchLib(libfile)
     
@@ -50,26 +57,30 @@ for libfile in libfiles:
     # dict of { libname : [alias, alias, alias] }
     unique_names = {}
     
+    # dict of { alias : [libname, libname] }, the components having each alias,
+    # in the order of the components
+    alias_owners = {}
+    
+    # order of the components, to keep the owners of an alias in order
+    order = {}
+    
     for cmp in lib.components:
     
         alias_list = []
     
         # Check component name
-        if cmp.name in unique_names.keys():
+        if cmp.name in unique_names:
             printer.green("Checking {lib}".format(lib=libfile))
         
             printer.yellow("Component '{cmp}' already exists".format(cmp=cmp.name))
             errors += 1
         else:
             # Check each existing alias
-            for key in unique_names.keys():
-                aliases = unique_names[key]
-                
-                if cmp.name in aliases:
-                    printer.yellow("Component '{cmp}' exists as an alias of '{key}'".format(
-                        cmp = cmp.name,
-                        key = key ))
-                    errors += 1
+            for key in alias_owners.get(cmp.name, []):
+                printer.yellow("Component '{cmp}' exists as an alias of '{key}'".format(
+                    cmp = cmp.name,
+                    key = key ))
+                errors += 1
         
         # Check each alias
         for alias in cmp.aliases.keys():
@@ -81,16 +92,50 @@ for libfile in libfiles:
                 errors += 1
                 
             # check each alias against all other aliases
-            for key in unique_names.keys():
-                aliases = unique_names[key]
-                
-                if alias in aliases:
-                    printer.yellow("Component '{cmp}' ALIAS '{alias}' exists as an alias of '{key}'".format(
-                        cmp = cmp.name,
-                        alias = alias,
-                        key = key ))
-                    errors += 1
-                
+            for key in alias_owners.get(alias, []):
+                printer.yellow("Component '{cmp}' ALIAS '{alias}' exists as an alias of '{key}'".format(
+                    cmp = cmp.name,
+                    alias = alias,
+                    key = key ))
+                errors += 1
+        
+        # a duplicated component replaces the aliases of the previous one
+        if cmp.name in unique_names:
+            for alias in unique_names[cmp.name]:
+                if cmp.name in alias_owners[alias]:
+                    alias_owners[alias].remove(cmp.name)
+        else:
+            order[cmp.name] = len(order)
+        
         unique_names[cmp.name] = alias_list
-            
+        
+        for alias in alias_list:
+            owners = alias_owners.setdefault(alias, [])
+            owners.append(cmp.name)
+            # a duplicated component keeps the place of the first one
+            if len(owners) > 1 and order[owners[-2]] > order[cmp.name]:
+                owners.sort(key=lambda key: order[key])
+        
+        # global index
+        for name in [cmp.name] + alias_list:
+            index.setdefault(name, []).append((libfile, cmp.name))
+
+# names defined in more than one library
+if args.cross_library:
+    if not args.silent:
+        printer.green("Checking across libraries")
+
+    for name, entries in index.items():
+        if len(set(libfile for libfile, owner in entries)) < 2:
+            continue
+
+        printer.yellow("'{name}' is defined in several libraries:".format(name=name))
+        errors += 1
+
+        for libfile, owner in entries:
+            if owner == name:
+                printer.regular("component in {lib}".format(lib=libfile), indentation=2)
+            else:
+                printer.regular("alias of '{cmp}' in {lib}".format(cmp=owner, lib=libfile), indentation=2)
+
 sys.exit(errors)
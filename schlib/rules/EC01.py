@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
+
 from rules.rule import *
 import re
 
@@ -25,8 +27,8 @@ class Rule(KLCRule):
         return len(self.wrong_pin_numbers) > 0
         
     def checkDuplicatePins(self):
-        # List of lists of pins
-        pin_lists = []
+        # Lists of pins, by (number, unit, convert), in order of first appearance
+        pin_lists = OrderedDict()
         
         # look for duplicate pin numbers
         # For a pin to be considered a duplicate, it must have:
@@ -38,25 +40,16 @@ class Rule(KLCRule):
         
         for pin in self.component.pins:
             
-            found = False
+            key = tuple(pin[k] for k in keys)
             
-            for i,pin_list in enumerate(pin_lists):
-                
-                # Compare against first item
-                p_test = pin_list[0]
-                
-                # Test each key
-                if all([pin[k] == p_test[k] for k in keys]):
-                    found = True
-                    pin_lists[i].append(pin)
-                    break
-                    
-            if not found:
-                pin_lists.append([pin])
+            if key in pin_lists:
+                pin_lists[key].append(pin)
+            else:
+                pin_lists[key] = [pin]
                 
         duplicate = False
                 
-        for pin_list in pin_lists:
+        for pin_list in pin_lists.values():
             # Look for duplicate groups
             if len(pin_list) > 1:
                 duplicate = True
@@ -72,10 +65,10 @@ class Rule(KLCRule):
         #check for missing pins within the range of pins
         missing = False
         
-        int_pins = []
+        int_pins = set()
         for pin in self.component.pins:
             try:
-                int_pins.append(int(pin['num']))
+                int_pins.add(int(pin['num']))
             except:
                 pass
         
@@ -2,6 +2,9 @@
 
 from rules.rule import *
 
+def rectangleString(rect):
+    return "Rectangle ({x1},{y1}) ({x2},{y2})".format(x1=rect['startx'], y1=rect['starty'], x2=rect['endx'], y2=rect['endy'])
+
 class Rule(KLCRule):
     """
     Create the methods check and fix to use with the kicad lib files.
@@ -20,13 +23,24 @@ class Rule(KLCRule):
             * recommended_fp_pos
             * recommended_fp_alignment
             * fp_is_missing
+            * unparsable
         """
 
         # check if component has just one rectangle, if not, skip checking
         if len(self.component.draw['rectangles']) != 1: return False
 
-        top = max(int(self.component.draw['rectangles'][0]['starty']), int(self.component.draw['rectangles'][0]['endy']))
-        bottom = min(int(self.component.draw['rectangles'][0]['starty']), int(self.component.draw['rectangles'][0]['endy']))
+        rect = self.component.draw['rectangles'][0]
+
+        # the positions can not be recommended from unparsable fields
+        pins = self.component.filterPins(direction='D') + self.component.filterPins(direction='U')
+        parsable = (self.parsableItems([rect], ['starty', 'endy'], rectangleString) +
+                    self.parsableItems(pins, ['posx']))
+        self.unparsable = len(parsable) < len(pins) + 1
+        if self.unparsable:
+            return True
+
+        top = max(rect.starty, rect.endy)
+        bottom = min(rect.starty, rect.endy)
 
         ## reference checking
 
@@ -37,7 +51,7 @@ class Rule(KLCRule):
 
         # otherwise, the recommended is put it before the first pin x position, right-aligned
         else:
-            x = min([int(i['posx']) for i in self.component.filterPins(direction='D')]) - 100
+            x = min([i.posx for i in self.component.filterPins(direction='D')]) - 100
             self.recommended_ref_pos = {'posx':x,'posy':(top + 125)}
             self.recommended_ref_alignment = 'R'
 
@@ -62,7 +76,7 @@ class Rule(KLCRule):
 
         # otherwise, the recommended is put it before the first pin x position, right-aligned
         else:
-            x = min([int(i['posx']) for i in self.component.filterPins(direction='D')]) - 100
+            x = min([i.posx for i in self.component.filterPins(direction='D')]) - 100
             self.recommended_name_pos = {'posx':x,'posy':(top + 50)}
             self.recommended_name_alignment = 'R'
 
@@ -84,7 +98,7 @@ class Rule(KLCRule):
 
         # otherwise, the recommended is put it after the last pin x position, left-aligned
         else:
-            x = max([int(i['posx']) for i in self.component.filterPins(direction='U')]) + 50
+            x = max([i.posx for i in self.component.filterPins(direction='U')]) + 50
             self.recommended_fp_pos = {'posx':x,'posy':(bottom - 50)}
             self.recommended_fp_alignment = 'L'
 
@@ -112,6 +126,10 @@ class Rule(KLCRule):
         """
         Proceeds the fixing of the rule, if possible.
         """
+        if self.unparsable:
+            self.info("Fix not supported")
+            return
+
         self.info("Fixing...")
         self.component.fields[0]['posx'] = str(self.recommended_ref_pos['posx'])
         self.component.fields[0]['posy'] = str(self.recommended_ref_pos['posy'])
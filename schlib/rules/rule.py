@@ -59,7 +59,8 @@ def pinString(pin, loc=True, unit=None, convert=None):
         unit = ' in unit {n}'.format(n=unit) if unit else '')
 
 def positionFormater(element):
-    if type(element) != type({}):
+    # dictionary or draw item record
+    if not hasattr(element, 'keys'):
         raise Exception("input type: ",type(element),"expected dictionary, ",element)
     if(not {"posx","posy"}.issubset(element.keys())):
         raise Exception("missing keys 'posx' and 'posy' in"+str(element))
@@ -78,5 +79,21 @@ class KLCRule(KLCRuleBase):
         KLCRuleBase.__init__(self, name, description)
         
         self.component = component
+
+    # the draw items (e.g. pins) whose integer fields (e.g. ['posx', 'posy'])
+    # can be parsed, an error is reported for each field which can not be
+    # parsed (item.posx is None), instead of checking the item with it
+    def parsableItems(self, items, keys, describe=pinString):
+        parsable = []
+        for item in items:
+            bad = [key for key in keys if getattr(item, key) is None]
+            for key in bad:
+                self.error("{item} has an unparsable '{key}' field: '{value}'".format(
+                    item = describe(item),
+                    key = key,
+                    value = item[key]))
+            if not bad:
+                parsable.append(item)
+        return parsable
         
     
@@ -12,9 +12,10 @@ class Rule(KLCRule):
     def checkPinOrigin(self):
         self.violating_pins = []
         err = False
-        for pin in self.component.pins:
-            posx = int(pin['posx'])
-            posy = int(pin['posy'])
+        pins = self.parsableItems(self.component.pins, ['posx', 'posy'])
+        for pin in pins:
+            posx = pin.posx
+            posy = pin.posy
             if (posx % 100) != 0 or (posy % 100) != 0:
                 self.violating_pins.append(pin)
                 if not err:
@@ -22,13 +23,14 @@ class Rule(KLCRule):
                 self.error(' - Pin {0} ({1}), {2}'.format(pin['name'], pin['num'], positionFormater(pin)))
                 err = True
     
-        return len(self.violating_pins) > 0
+        return len(self.violating_pins) > 0 or len(pins) < len(self.component.pins)
     
     def checkPinLength(self):
         self.violating_pins = []
         
-        for pin in self.component.pins:
-            length = int(pin['length'])
+        pins = self.parsableItems(self.component.pins, ['length'])
+        for pin in pins:
+            length = pin.length
             
             err = False
             
@@ -54,7 +56,7 @@ class Rule(KLCRule):
             if err:
                 self.violating_pins.append(pin)
 
-        return len(self.violating_pins) > 0
+        return len(self.violating_pins) > 0 or len(pins) < len(self.component.pins)
     
     def check(self):
     
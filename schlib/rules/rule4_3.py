@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
+
 from rules.rule import *
 
 class Rule(KLCRule):
@@ -38,7 +40,8 @@ class Rule(KLCRule):
         # List of lists of pins that are entirely duplicated
         self.duplicated_pins = []
         
-        pin_locations = []
+        # Pins grouped by location, in order of first appearance
+        pin_locations = OrderedDict()
         
         for pin in self.component.pins:
             
@@ -49,27 +52,18 @@ class Rule(KLCRule):
             pinu = pin['unit']    # unit (for multi-unit parts)
             pinc = pin['convert'] # convert (de morgan)
             
-            dupe = False
-            
-            for loc in pin_locations:
+            key = (pinx, piny, pinu, pinc)
             
-                locx = loc['x']
-                locy = loc['y']
-                locu = loc['u']
-                locc = loc['c']
-                
-                if pinx == locx and piny == locy and pinu == locu and pinc == locc:
-                    loc['pins'].append(pin)
-                    dupe = True
-                    
-            if not dupe:
+            if key in pin_locations:
+                pin_locations[key]['pins'].append(pin)
+            else:
                 new_loc = {'x': pinx, 'y': piny, 'u': pinu, 'c': pinc}
                 new_loc['pins'] = [pin]
-                pin_locations.append(new_loc)
+                pin_locations[key] = new_loc
                     
         err = False
                     
-        for loc in pin_locations:
+        for loc in pin_locations.values():
             if len(loc['pins']) > 1:
                 
                 pin_units = set()
@@ -94,7 +88,7 @@ class Rule(KLCRule):
                         self.error("NC {pin} @ ({x},{y})is stacked on other pins".format(
                             pin = self.pinStr(pin),
                             x = pin['posx'],
-                            y = -1*int(pin['posy'])))
+                            y = -1*pin.posy))
                         err = True
                         self.NC_stacked=True
                             
@@ -32,15 +32,17 @@ class Rule(KLCRule):
 
 
         self.violating_pins = []
-        for pin in self.component.pins:
-            name_text_size = int(pin['name_text_size'])
-            num_text_size = int(pin['num_text_size'])
+        pins = self.parsableItems(self.component.pins, ['name_text_size', 'num_text_size'])
+        for pin in pins:
+            name_text_size = pin.name_text_size
+            num_text_size = pin.num_text_size
             if (name_text_size != 50) or (num_text_size != 50):
                 self.violating_pins.append(pin)
                 self.error(' - Pin {0} ({1}), text size {2}, number size {3}'.format(pin['name'], pin['num'], pin['name_text_size'], pin['num_text_size']))
 
         if (len(self.violating_fields) > 0 or
-            len(self.violating_pins) > 0):
+            len(self.violating_pins) > 0 or
+            len(pins) < len(self.component.pins)):
             return True
 
         return False
@@ -1,9 +1,29 @@
 # -*- coding: utf-8 -*-
 
-import sys, shlex
+import sys, os
 import os.path
 from collections import OrderedDict
 import hashlib
+import operator
+
+common = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+if not common in sys.path:
+    sys.path.append(common)
+
+from line_tokenizer import splitLine
+
+# Algorithm of the checksums of the libraries, documentations and components,
+# any algorithm of hashlib ('blake2b' is faster than the default 'md5')
+# Only checksums computed with the same algorithm can be compared
+checksum_algorithm = 'md5'
+
+# An incremental hash object for a checksum
+def newChecksum():
+    if checksum_algorithm.startswith('blake2'):
+        # same length as the md5 checksums
+        return hashlib.new(checksum_algorithm, digest_size=16)
+    return hashlib.new(checksum_algorithm)
 
 class Documentation(object):
     """
@@ -54,10 +74,15 @@ class Documentation(object):
         name = None
         f.seek(0)
         
-        checksum_data = ''
+        checksum = newChecksum()
+        update = checksum.update
         
         for line in f.readlines():
-            checksum_data += line.strip()
+            try:
+                update(line.strip().encode('utf-8'))
+            except UnicodeDecodeError:
+                # python 2 lines are already bytes
+                update(line.strip())
             line = line.replace('\n', '')
             if line.startswith(Documentation.line_keys['start']):
                 name = line[5:]
@@ -75,34 +100,33 @@ class Documentation(object):
             #FIXME: we do not handle comments except separators around components
         f.close()
         
-        try:
-            md5 = hashlib.md5(checksum_data.encode('utf-8'))
-        except UnicodeDecodeError:
-            md5 = hashlib.md5(checksum_data)
-            
-        self.checksum = md5.hexdigest()
+        self.checksum = checksum.hexdigest()
         
         return True
 
-    def save(self, filename=None):
-        if not self.validFile: return False
+    # the lines of the file (the header is not modified)
+    def _lines(self):
+        for line in self.header:
+            yield line
 
-        if not filename: filename = self.filename
-
-        to_write=self.header
         for name,doc in self.components.items():
-            to_write.append('#\n')#just spacer (no even in dcm format specification, but used everywhere)
-            to_write.append(self.line_keys['start']+name+'\n')
+            yield '#\n'#just spacer (no even in dcm format specification, but used everywhere)
+            yield self.line_keys['start']+name+'\n'
             for key in doc.keys():
                 if(doc[key]!=None):
-                    to_write.append( self.line_keys[key]+doc[key]+'\n')
-            to_write.append(self.line_keys['end']+'\n')
-        to_write.append("#\n")#again, spacer^^
-        to_write.append("#End Doc Library\n")
+                    yield self.line_keys[key]+doc[key]+'\n'
+            yield self.line_keys['end']+'\n'
+        yield "#\n"#again, spacer^^
+        yield "#End Doc Library\n"
 
-        f = open(filename, 'w')
-        f.writelines(to_write)
-        f.close()
+    def save(self, filename=None):
+        if not self.validFile: return False
+
+        if not filename: filename = self.filename
+
+        # the lines are streamed to the (buffered) file
+        with open(filename, 'w') as f:
+            f.writelines(self._lines())
 
     def remove(self, name):
         if name in self.components.keys():#delete only if it exists
@@ -140,18 +164,20 @@ class Component(object):
         building_draw = False
         building_fields = False
         
-        checksum_data = ''
+        checksum = newChecksum()
+        update = checksum.update
         
         self.resetDraw()
+        self._pin_index = None
         
         for line in data:
-            checksum_data += line.strip()
+            try:
+                update(line.strip().encode('utf-8'))
+            except UnicodeDecodeError:
+                # python 2 lines are already bytes
+                update(line.strip())
             line = line.replace('\n', '')
-            s = shlex.shlex(line)
-            s.whitespace_split = True
-            s.commenters = ''
-            s.quotes = '"'
-            line = list(s)
+            line = splitLine(line)
 
             if line[0] in self._KEYS:
                 key_list = self._KEYS[line[0]]
@@ -187,10 +213,10 @@ class Component(object):
 
                 elif building_draw:
                     if line[0] == 'A':
-                        self.draw['arcs'].append(dict(zip(self._ARC_KEYS,values)))
+                        self.draw['arcs'].append(Arc(values))
                         self.drawOrdered.append(['A',self.draw['arcs'][-1]])
                     if line[0] == 'C':
-                        self.draw['circles'].append(dict(zip(self._CIRCLE_KEYS,values)))
+                        self.draw['circles'].append(Circle(values))
                         self.drawOrdered.append(['C',self.draw['circles'][-1]])
                     if line[0] == 'P':#mixing X an Y points into 1 list in not handy
                         n_points = int(line[1])
@@ -200,16 +226,16 @@ class Component(object):
                             values += [line[-1]]
                         else:
                             values += ['']
-                        self.draw['polylines'].append(dict(zip(self._POLY_KEYS,values)))
+                        self.draw['polylines'].append(Polyline(values))
                         self.drawOrdered.append(['P',self.draw['polylines'][-1]])
                     if line[0] == 'S':
-                        self.draw['rectangles'].append(dict(zip(self._RECT_KEYS,values)))
+                        self.draw['rectangles'].append(Rectangle(values))
                         self.drawOrdered.append(['S',self.draw['rectangles'][-1]])
                     if line[0] == 'T':
-                        self.draw['texts'].append(dict(zip(self._TEXT_KEYS,values)))
+                        self.draw['texts'].append(Text(values))
                         self.drawOrdered.append(['T',self.draw['texts'][-1]])
                     if line[0] == 'X':
-                        self.draw['pins'].append(dict(zip(self._PIN_KEYS,values)))
+                        self.draw['pins'].append(Pin(values))
                         self.drawOrdered.append(['X',self.draw['pins'][-1]])
 
                 elif building_fields:
@@ -221,12 +247,7 @@ class Component(object):
                         values = line[1:] + ['' for n in range(len(self._FN_KEYS) - len(line[1:]))]
                         self.fields.append(dict(zip(self._FN_KEYS,values)))
 
-        #perform checksum calculation
-        try:
-            md5 = hashlib.md5(checksum_data.encode('utf-8'))
-        except UnicodeDecodeError:
-            md5 = hashlib.md5(checksum_data)
-        self.checksum = md5.hexdigest()
+        self.checksum = checksum.hexdigest()
 
         # define some shortcuts
         self.name = self.definition['name']
@@ -252,32 +273,326 @@ class Component(object):
         except KeyError:
             return {}
 
+    # the pin indexes, built on first use and rebuilt when the pins have changed:
+    # a field of a pin of the component was set (see Pin.__setitem__), or pins
+    # were added or removed
+    def _pinIndex(self):
+        index = self._pin_index
+
+        if index is None or index['pins'] is not self.pins or index['count'] != len(self.pins):
+            self._convertPins()
+
+            index = {
+                'pins': self.pins,
+                'count': len(self.pins),
+                'position': {},
+                'num': {},
+                'name': {},
+                'direction': {},
+                'electrical_type': {},
+                'location': {},
+                }
+
+            for i, pin in enumerate(self.pins):
+                # the changes of the pin drop the index
+                pin._component = self
+                index['position'][id(pin)] = i
+                for key in ['num', 'name', 'direction', 'electrical_type']:
+                    index[key].setdefault(pin[key], []).append(pin)
+                index['location'].setdefault((pin.posx, pin.posy, pin.unit, pin.convert), []).append(pin)
+
+            self._pin_index = index
+
+        return index
+
+    # convert the pins appended to self.pins as dictionaries to Pin items
+    def _convertPins(self):
+        converted = {}
+        for i, pin in enumerate(self.pins):
+            if not isinstance(pin, Pin):
+                self.pins[i] = _asPin(pin)
+                converted[id(pin)] = (pin, self.pins[i])
+
+        if converted:
+            for el in self.drawOrdered:
+                if el[0] == 'X' and id(el[1]) in converted:
+                    el[1] = converted[id(el[1])][1]
+
+    def invalidatePinIndex(self):
+        self._pin_index = None
+
+    # the index is not copied (the pins of a copy are new items)
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_pin_index'] = None
+        return state
+
+    # add a pin (a Pin or a dictionary of the pin fields), returns the added Pin
+    def addPin(self, pin):
+        pin = _asPin(pin)
+        self.pins.append(pin)
+        self.drawOrdered.append(['X', pin])
+        self.invalidatePinIndex()
+        return pin
+
+    def removePin(self, pin):
+        # remove this very pin (an identical duplicate may exist)
+        for i, p in enumerate(self.pins):
+            if p is pin:
+                del self.pins[i]
+                break
+        self.drawOrdered = [el for el in self.drawOrdered if el[1] is not pin]
+        self.invalidatePinIndex()
+
     def getPinsByName(self, name):
-        pins = []
-        for pin in self.pins:
-            if pin['name'] == name:
-                pins.append(pin)
+        return list(self._pinIndex()['name'].get(name, []))
 
-        return pins
+    def getPinsByNumber(self, num):
+        return list(self._pinIndex()['num'].get(str(num), []))
 
     def getPinByNumber(self, num):
-        for pin in self.draw['pins']:
-            if pin['num'] == str(num):
-                return pin
+        pins = self._pinIndex()['num'].get(str(num))
+        return pins[0] if pins else None
 
-        return None
+    # pins at the given location (integer coordinates)
+    def getPinsAt(self, posx, posy, unit, convert):
+        return list(self._pinIndex()['location'].get((posx, posy, unit, convert), []))
 
     def filterPins(self, name=None, direction=None, electrical_type=None):
-        pins = []
+        index = self._pinIndex()
+
+        groups = []
+        if name:
+            groups.append(index['name'].get(name, []))
+        if direction:
+            groups.append(index['direction'].get(direction, []))
+        if electrical_type:
+            groups.append(index['electrical_type'].get(electrical_type, []))
+
+        if len(groups) == 1:
+            return list(groups[0])
+
+        # pins matching any of the filters, in the order of the component
+        pins = {}
+        for group in groups:
+            for pin in group:
+                pins[id(pin)] = pin
+
+        return [pins[i] for i in sorted(pins, key=lambda i: index['position'][i])]
+
+# an integer field, None if the field is not an integer
+def _intField(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
-        for pin in self.pins:
-            if ((name and pin['name'] == name) or
-                (direction and pin['direction'] == direction) or
-                (electrical_type and pin['electrical_type'] == electrical_type)):
-                pins.append(pin)
+# the slots of a DrawItem class: the fields (as read from the file) and the integer fields
+def _slots(keys, int_keys):
+    return tuple('_' + key for key in keys) + tuple('_int_' + key for key in int_keys)
 
-        return pins
+class DrawItem(object):
+    """
+    A compact record of a draw item (arc, circle, polyline, rectangle, text or pin) of a component
 
+    The fields are accessed like a dictionary (e.g. pin['posx']) and hold the
+    strings read from the file, so the item is saved back unchanged.
+    The integer fields can also be read as attributes (e.g. pin.posx), they
+    are parsed once on first use and updated when the field is set:
+    pin['posx'] = '100'
+    """
+
+    __slots__ = ()
+
+    # the fields of the item, and those which are integers
+    KEYS = []
+    INT_KEYS = []
+
+    # the values of the fields, in the order of KEYS (missing fields are
+    # empty, extra values are ignored)
+    def __init__(self, values):
+        slots = self._FIELD_SLOTS
+        if len(values) != len(slots):
+            values = list(values[:len(slots)]) + ['' for i in range(len(slots) - len(values))]
+        for slot, value in zip(slots, values):
+            setattr(self, slot, value)
+
+    def __getitem__(self, key):
+        if not key in self._KEYS_SET:
+            raise KeyError(key)
+        return getattr(self, '_' + key)
+
+    def __setitem__(self, key, value):
+        if not key in self._KEYS_SET:
+            raise KeyError(key)
+        setattr(self, '_' + key, value)
+        if key in self._INT_KEYS_SET:
+            # parsed again on next use
+            try:
+                delattr(self, '_int_' + key)
+            except AttributeError:
+                pass
+
+    def __contains__(self, key):
+        return key in self._KEYS_SET
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __eq__(self, other):
+        if isinstance(other, DrawItem):
+            return self.KEYS == other.KEYS and self.values() == other.values()
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{cls}({items})'.format(cls=self.__class__.__name__, items=dict(self.items()))
+
+    def keys(self):
+        return list(self.KEYS)
+
+    def values(self):
+        return [getattr(self, slot) for slot in self._FIELD_SLOTS]
+
+    def items(self):
+        return list(zip(self.KEYS, self.values()))
+
+    def get(self, key, default=None):
+        if key in self._KEYS_SET:
+            return self[key]
+        return default
+
+    # the state used by pickle and copy (there is no __dict__)
+    def __getstate__(self):
+        return self.values()
+
+    def __setstate__(self, values):
+        self.__init__(values)
+
+# read-only attribute of an integer field, parsed on first use
+def _intProperty(key):
+    slot = '_' + key
+    int_slot = '_int_' + key
+
+    def get(self):
+        try:
+            return getattr(self, int_slot)
+        except AttributeError:
+            value = _intField(getattr(self, slot))
+            setattr(self, int_slot, value)
+            return value
+
+    return property(get, doc="'{key}' field as an integer".format(key=key))
+
+# add the lookup sets, the field slots and the integer attributes to a DrawItem class
+def _drawItemClass(cls):
+    cls._KEYS_SET = frozenset(cls.KEYS)
+    cls._INT_KEYS_SET = frozenset(cls.INT_KEYS)
+    cls._FIELD_SLOTS = tuple('_' + key for key in cls.KEYS)
+
+    for key in cls.INT_KEYS:
+        setattr(cls, key, _intProperty(key))
+    return cls
+
+@_drawItemClass
+class Arc(DrawItem):
+    KEYS = Component._ARC_KEYS
+    INT_KEYS = ['posx','posy','radius','start_angle','end_angle','unit','convert','thickness','startx','starty','endx','endy']
+    __slots__ = _slots(KEYS, INT_KEYS)
+
+@_drawItemClass
+class Circle(DrawItem):
+    KEYS = Component._CIRCLE_KEYS
+    INT_KEYS = ['posx','posy','radius','unit','convert','thickness']
+    __slots__ = _slots(KEYS, INT_KEYS)
+
+@_drawItemClass
+class Polyline(DrawItem):
+    KEYS = Component._POLY_KEYS
+    INT_KEYS = ['point_count','unit','convert','thickness']
+    __slots__ = _slots(KEYS, INT_KEYS)
+
+@_drawItemClass
+class Rectangle(DrawItem):
+    KEYS = Component._RECT_KEYS
+    INT_KEYS = ['startx','starty','endx','endy','unit','convert','thickness']
+    __slots__ = _slots(KEYS, INT_KEYS)
+
+@_drawItemClass
+class Text(DrawItem):
+    KEYS = Component._TEXT_KEYS
+    INT_KEYS = ['direction','posx','posy','text_size','unit','convert']
+    __slots__ = _slots(KEYS, INT_KEYS)
+
+@_drawItemClass
+class Pin(DrawItem):
+    KEYS = Component._PIN_KEYS
+    INT_KEYS = ['posx','posy','length','name_text_size','num_text_size','unit','convert']
+    # _component is the component whose pin indexes contain the pin
+    __slots__ = _slots(KEYS, INT_KEYS) + ('_component',)
+
+    def __setitem__(self, key, value):
+        DrawItem.__setitem__(self, key, value)
+
+        # the pin indexes of the component are rebuilt on next use
+        try:
+            self._component.invalidatePinIndex()
+        except AttributeError:
+            pass
+
+# a Pin from a pin added to a component: a Pin, or a dictionary of the pin
+# fields (missing fields are empty)
+def _asPin(pin):
+    if isinstance(pin, Pin):
+        return pin
+    if isinstance(pin, dict):
+        return Pin([pin.get(key, '') for key in Pin.KEYS])
+    raise TypeError("A pin must be a Pin or a dictionary, not {t}".format(t=type(pin).__name__))
+
+# a function formatting the line of a record: the keyword and the values of
+# the keys, separated by spaces (the points of a polyline are expanded)
+# the values of the DrawItems of class cls are read directly from their slots
+def _recordFormatter(keyword, keys, cls=None):
+    prefix = keyword + ' '
+    getter = operator.itemgetter(*keys)
+
+    if 'points' in keys:
+        i = keys.index('points')
+
+        def format(item):
+            values = list(item.values() if item.__class__ is cls else getter(item))
+            values[i:i+1] = ['{0}'.format(point) for point in item['points']]
+            return (prefix + ' '.join(values)).rstrip() + '\n'
+    else:
+        def format(item):
+            return (prefix + ' '.join(item.values() if item.__class__ is cls else getter(item))).rstrip() + '\n'
+
+    return format
+
+_DEF_FORMATTER = _recordFormatter('DEF', Component._DEF_KEYS)
+
+_DRAW_FORMATTERS = dict((kind, _recordFormatter(kind, Component._DRAW_KEYS[kind], cls))
+    for kind, cls in [('A', Arc), ('C', Circle), ('P', Polyline), ('S', Rectangle), ('T', Text), ('X', Pin)])
+
+# the line of the field i of a component (the first value is quoted)
+def _fieldLine(i, field):
+    keys = Component._F0_KEYS if i == 0 else Component._FN_KEYS
+    values = [field[key] for key in keys]
+
+    if not values[0].startswith('"'):
+        values[0] = '"' + values[0] + '"'
+
+    return ('F{n} '.format(n=i) + ' '.join(values)).rstrip() + '\n'
 
 class SchLib(object):
     """
@@ -322,11 +637,16 @@ class SchLib(object):
     def __parse(self):
         f = open(self.filename, 'r')
         
-        checksum_data = ""
+        checksum = newChecksum()
+        update = checksum.update
         
         self.header = [f.readline()]
 
-        checksum_data += self.header[0]
+        try:
+            update(self.header[0].encode('utf-8'))
+        except UnicodeDecodeError:
+            # python 2 lines are already bytes
+            update(self.header[0])
         
         if self.header and not SchLib.line_keys['header'] in self.header[0]:
             sys.stderr.write("'{fn}' is not a KiCad Schematic Library File\n".format(fn=self.filename))
@@ -338,7 +658,11 @@ class SchLib(object):
         comments = []
         for line in f.readlines():
         
-            checksum_data += line.strip()
+            try:
+                update(line.strip().encode('utf-8'))
+            except UnicodeDecodeError:
+                # python 2 lines are already bytes
+                update(line.strip())
         
             if line.startswith('#'):
                 comments.append(line)
@@ -356,12 +680,7 @@ class SchLib(object):
                     comments = []
         f.close()
         
-        #perform checksum calculation
-        try:
-            md5 = hashlib.md5(checksum_data.encode('utf-8'))
-        except UnicodeDecodeError:
-            md5 = hashlib.md5(checksum_data)
-        self.checksum = md5.hexdigest()
+        self.checksum = checksum.hexdigest()
         
         return True
         
@@ -410,88 +729,53 @@ class SchLib(object):
 
         self.documentation.save(self.libToDcmFilename(filename))
 
+        # the lines are streamed to the (buffered) file
+        with open(filename, 'w') as f:
+            f.writelines(self._lines())
 
+    # the lines of the library file (the header is not modified)
+    def _lines(self):
         # insert the header
-        to_write = self.header
+        for line in self.header:
+            yield line
 
         # insert the components
         for component in self.components:
             # append the component comments
-            to_write += component.comments
+            for line in component.comments:
+                yield line
 
             # DEF
-            line = 'DEF '
-            for key in Component._DEF_KEYS:
-                line += component.definition[key] + ' '
-
-            line = line.rstrip() + '\n'
-            to_write.append(line)
+            yield _DEF_FORMATTER(component.definition)
 
             # FIELDS
-            line = 'F'
-            for i, f in enumerate(component.fields):
-                line = "F{n} ".format(n=i)
-
-                if i == 0:
-                    keys_list = Component._F0_KEYS
-                else:
-                    keys_list = Component._FN_KEYS
-
-                for k, key in enumerate(keys_list):
-                    key_val = component.fields[i][key]
-                    
-                    if k == 0 and not key_val.startswith('"'):
-                        key_val = '"' + key_val + '"'
-                        
-                    line += key_val + ' '
-
-                line = line.rstrip() + '\n'
-                to_write.append(line)
+            for i, field in enumerate(component.fields):
+                yield _fieldLine(i, field)
 
             # ALIAS
             if len(component.aliases) > 0:
-                line = 'ALIAS '
-                for alias in component.aliases.keys():
-                    line += alias + ' '
-
-                line = line.rstrip() + '\n'
-                to_write.append(line)
+                yield ('ALIAS ' + ' '.join(component.aliases.keys())).rstrip() + '\n'
 
             # $FPLIST
             if len(component.fplist) > 0:
-                to_write.append('$FPLIST\n')
+                yield '$FPLIST\n'
                 for fp in component.fplist:
-                    to_write.append(' ' + fp + '\n')
+                    yield ' ' + fp + '\n'
 
             # $ENDFPLIST
-                to_write.append('$ENDFPLIST\n')
+                yield '$ENDFPLIST\n'
 
             # DRAW
-            to_write.append('DRAW\n')
-            for elem in component.drawOrdered:
-                item=elem[1]
-                keys_list = Component._DRAW_KEYS[elem[0]]# 'A' -> keys of all properties of arc
-                line = elem[0] + ' '# 'arcs' -> 'A'
-                for k in keys_list:
-                    if k == 'points':
-                        for i in item['points']:
-                            line += '{0} '.format(i)
-                    else:
-                        line += item[k] + ' '
-
-                line = line.rstrip() + '\n'
-                to_write.append(line)
+            yield 'DRAW\n'
+            for kind, item in component.drawOrdered:
+                yield _DRAW_FORMATTERS[kind](item)
 
             # ENDDRAW
-            to_write.append('ENDDRAW\n')
+            yield 'ENDDRAW\n'
 
             # ENDDEF
-            to_write.append('ENDDEF\n')
+            yield 'ENDDEF\n'
 
         # insert the footer
-        to_write.append('#\n')
-        to_write.append('#End Library\n')
-
-        f = open(filename, 'w')
-        f.writelines(to_write)
-        f.close()
+        yield '#\n'
+        yield '#End Library\n'
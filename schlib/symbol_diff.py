@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+"""
+
+Semantic diff of two versions of a symbol (schlib.Component).
+
+The result of diffComponents is made of dictionaries, lists and strings only,
+so it can be written as JSON. Only the sections which changed are present:
+
+    {
+        'name': 'LM358',
+        'definition': {'unit_count': ['1', '2']},
+        'fields': {'changed': [{'field': 'F2', 'changes': {'name': ['"A"', '"B"']}}],
+                   'added': [{'field': 'F4', ...}], 'removed': [...]},
+        'aliases': {'added': ['LM2904'], 'removed': []},
+        'fplist': {'added': ['SOIC*'], 'removed': ['DIP*']},
+        'pins': {'changed': [{'num': '1', 'unit': '1', 'convert': '1', 'changes': {'posx': ['0', '100']}}],
+                 'added': [{pin fields}], 'removed': [{pin fields}]},
+        'draw': {'changed': [...], 'added': [...], 'removed': [...]},
+        'documentation': {'LM358': {'description': ['old', 'new']}},
+    }
+
+Pins are matched by (number, unit, convert), the other draw items by kind and
+position, fields by index (F0 to F3) or by name (user fields). All the matching
+is done with dictionaries, in linear time.
+
+"""
+
+from collections import OrderedDict, deque
+
+# the position of each kind of draw item, used to match the items
+_DRAW_POSITION = {
+    'A': ['posx', 'posy'],
+    'C': ['posx', 'posy'],
+    'P': ['points'],
+    'S': ['startx', 'starty', 'endx', 'endy'],
+    'T': ['posx', 'posy'],
+    }
+
+_DRAW_KINDS = {'A': 'arc', 'C': 'circle', 'P': 'polyline', 'S': 'rectangle', 'T': 'text'}
+
+# the dictionary of an item (draw item or field), for the JSON output
+def _itemDict(item):
+    return OrderedDict((key, item[key]) for key in item.keys())
+
+# changed values of two items with the same keys, as {key: [old, new]}
+def _changedValues(old, new):
+    changes = OrderedDict()
+    for key in new.keys():
+        old_value = old.get(key)
+        if old_value != new[key]:
+            changes[key] = [old_value, new[key]]
+    for key in old.keys():
+        if not key in new:
+            changes[key] = [old[key], None]
+    return changes
+
+# match two lists of items by key, in order for items with the same key
+# returns the list of matched (old, new) pairs, the added and the removed items
+def _matchItems(old_items, new_items, key):
+    old_by_key = OrderedDict()
+    for item in old_items:
+        old_by_key.setdefault(key(item), deque()).append(item)
+
+    matched = []
+    added = []
+    for item in new_items:
+        candidates = old_by_key.get(key(item))
+        if candidates:
+            matched.append((candidates.popleft(), item))
+        else:
+            added.append(item)
+
+    removed = [item for items in old_by_key.values() for item in items]
+
+    return matched, added, removed
+
+# added and removed entries of two lists of strings
+def _diffList(old, new):
+    old_set = set(old)
+    new_set = set(new)
+    result = OrderedDict()
+    added = [entry for entry in new if not entry in old_set]
+    removed = [entry for entry in old if not entry in new_set]
+    if added or removed:
+        result['added'] = added
+        result['removed'] = removed
+    return result
+
+def _fieldKey(index_field):
+    i, field = index_field
+    # reference, value, footprint and datasheet by index, user fields by name
+    return i if i < 4 else field['fieldname']
+
+def _diffFields(old, new):
+    matched, added, removed = _matchItems(list(enumerate(old.fields)), list(enumerate(new.fields)), _fieldKey)
+
+    result = OrderedDict()
+
+    changed = []
+    for (i_old, f_old), (i_new, f_new) in matched:
+        changes = _changedValues(f_old, f_new)
+        if changes:
+            changed.append(OrderedDict([('field', 'F{n}'.format(n=i_new)), ('changes', changes)]))
+
+    if changed:
+        result['changed'] = changed
+    if added:
+        result['added'] = [OrderedDict([('field', 'F{n}'.format(n=i))] + list(_itemDict(f).items())) for i, f in added]
+    if removed:
+        result['removed'] = [OrderedDict([('field', 'F{n}'.format(n=i))] + list(_itemDict(f).items())) for i, f in removed]
+
+    return result
+
+def _pinKey(pin):
+    return (pin['num'], pin['unit'], pin['convert'])
+
+def _diffPins(old, new):
+    matched, added, removed = _matchItems(old.pins, new.pins, _pinKey)
+
+    result = OrderedDict()
+
+    changed = []
+    for p_old, p_new in matched:
+        changes = _changedValues(p_old, p_new)
+        if changes:
+            changed.append(OrderedDict([('num', p_new['num']), ('unit', p_new['unit']), ('convert', p_new['convert']), ('changes', changes)]))
+
+    if changed:
+        result['changed'] = changed
+    if added:
+        result['added'] = [_itemDict(pin) for pin in added]
+    if removed:
+        result['removed'] = [_itemDict(pin) for pin in removed]
+
+    return result
+
+def _drawItems(component):
+    # all draw items but the pins, as (kind, item)
+    return [(kind, item) for kind, item in getattr(component, 'drawOrdered', []) if kind != 'X']
+
+def _drawKey(kind_item):
+    kind, item = kind_item
+    return (kind,) + tuple(str(item[key]) for key in _DRAW_POSITION[kind])
+
+def _drawDict(kind, item):
+    return OrderedDict([('kind', _DRAW_KINDS[kind])] + list(_itemDict(item).items()))
+
+def _diffDraw(old, new):
+    matched, added, removed = _matchItems(_drawItems(old), _drawItems(new), _drawKey)
+
+    result = OrderedDict()
+
+    changed = []
+    for (kind, i_old), (new_kind, i_new) in matched:
+        changes = _changedValues(i_old, i_new)
+        if changes:
+            position = [(key, i_new[key]) for key in _DRAW_POSITION[kind]]
+            changed.append(OrderedDict([('kind', _DRAW_KINDS[kind])] + position + [('changes', changes)]))
+
+    if changed:
+        result['changed'] = changed
+    if added:
+        result['added'] = [_drawDict(kind, item) for kind, item in added]
+    if removed:
+        result['removed'] = [_drawDict(kind, item) for kind, item in removed]
+
+    return result
+
+def _diffDocumentation(old, new):
+    result = OrderedDict()
+
+    old_docs = OrderedDict([(old.name, old.documentation)] + list(old.aliases.items()))
+    new_docs = OrderedDict([(new.name, new.documentation)] + list(new.aliases.items()))
+
+    for name, doc in new_docs.items():
+        old_doc = old_docs.get(name) or {}
+        changes = _changedValues(old_doc, doc or {})
+        if changes:
+            result[name] = changes
+
+    return result
+
+def diffComponents(old, new):
+    """
+    Returns the differences between two versions of a component (see above)
+    """
+    diff = OrderedDict([('name', new.name)])
+
+    sections = [
+        ('definition', _changedValues(old.definition, new.definition)),
+        ('fields', _diffFields(old, new)),
+        ('aliases', _diffList(list(old.aliases.keys()), list(new.aliases.keys()))),
+        ('fplist', _diffList(old.fplist, new.fplist)),
+        ('pins', _diffPins(old, new)),
+        ('draw', _diffDraw(old, new)),
+        ('documentation', _diffDocumentation(old, new)),
+        ]
+
+    for name, section in sections:
+        if section:
+            diff[name] = section
+
+    return diff
+
+# short description of a pin or draw item
+def _itemString(item):
+    if 'kind' in item:
+        position = ', '.join(str(item[key]) for key in item if key in ['posx', 'posy', 'startx', 'starty', 'endx', 'endy', 'points'])
+        return '{kind} @ ({pos})'.format(kind=item['kind'], pos=position)
+
+    if 'field' in item:
+        return 'field {f}'.format(f=item['field'])
+
+    return 'pin {name} ({num}) @ ({x},{y}) unit {unit}'.format(name=item['name'], num=item['num'], x=item['posx'], y=item['posy'], unit=item['unit'])
+
+def _changesString(changes):
+    return ', '.join("{key}: '{old}' -> '{new}'".format(key=key, old=old, new=new) for key, (old, new) in changes.items())
+
+def diffLines(diff):
+    """
+    Returns a human readable description of a diff, as a list of lines
+    """
+    lines = []
+
+    if 'definition' in diff:
+        lines.append('definition: ' + _changesString(diff['definition']))
+
+    for section in ['fields', 'pins', 'draw']:
+        for change in diff.get(section, {}).get('changed', []):
+            if section == 'pins':
+                name = 'pin {num} (unit {unit})'.format(num=change['num'], unit=change['unit'])
+            elif section == 'fields':
+                name = 'field {f}'.format(f=change['field'])
+            else:
+                name = _itemString(change)
+            lines.append('{name}: {changes}'.format(name=name, changes=_changesString(change['changes'])))
+        for item in diff.get(section, {}).get('added', []):
+            lines.append('+ ' + _itemString(item))
+        for item in diff.get(section, {}).get('removed', []):
+            lines.append('- ' + _itemString(item))
+
+    for section in ['aliases', 'fplist']:
+        for entry in diff.get(section, {}).get('added', []):
+            lines.append('+ {s} {e}'.format(s=section, e=entry))
+        for entry in diff.get(section, {}).get('removed', []):
+            lines.append('- {s} {e}'.format(s=section, e=entry))
+
+    for name, changes in diff.get('documentation', {}).items():
+        lines.append('documentation of {name}: {changes}'.format(name=name, changes=_changesString(changes)))
+
+    return lines
@@ -0,0 +1,60 @@
+#!/usr/bin/bash
+
+# This script file is used to test that the JSON report written by
+# comparelibs.py to the standard output (--json -) stays valid when the
+# changed components are checked (--check), with and without worker
+# processes. The report must be the same as the one written to a file.
+
+# example of use: ./test_comparelibs.sh old_library_dir new_library_dir
+# (two .lib files can be given instead of directories)
+
+if [[ $# < 2 ]]; then
+    echo "Usage: $0 old new"
+    exit 1
+fi
+
+# colors
+RED="\e[0;31m"
+GREEN="\e[0;32m"
+NOCOLOR="\e[0m"
+
+here=`dirname "$0"`
+tmp=`mktemp -d`
+
+python "$here/comparelibs.py" --old "$1" --new "$2" --json "$tmp/report.json" > /dev/null
+
+error=0
+for jobs in 1 2; do
+    echo "* testing --json - --check -j $jobs"
+    python "$here/comparelibs.py" --old "$1" --new "$2" --json - --check -j $jobs > "$tmp/stdout.json" 2> /dev/null
+
+# python code --- START
+python << EOF
+import json, sys
+
+with open('$tmp/report.json') as f:
+    expected = json.load(f)
+
+with open('$tmp/stdout.json') as f:
+    try:
+        report = json.loads(f.read())
+    except ValueError as e:
+        print('the standard output is not valid JSON: %s' % e)
+        sys.exit(1)
+
+if report != expected:
+    print('the report differs from the one written to a file')
+    sys.exit(1)
+EOF
+# python code --- END
+
+    if [[ $? == 0 ]]; then
+        echo -e "${GREEN}...OK${NOCOLOR}"
+    else
+        echo -e "${RED}invalid JSON report on the standard output${NOCOLOR}"
+        error=1
+    fi
+done
+
+rm -rf "$tmp"
+exit $error